@@ -1,17 +1,29 @@
 import logging
+import sys
 import numpy as np
 import pyqtgraph as pg
-from brainflow.board_shim import BoardShim, BrainFlowInputParams, BoardIds, BrainFlowPresets
-from brainflow.data_filter import DataFilter, DetrendOperations
-from PyQt5.QtWidgets import QApplication, QPushButton, QVBoxLayout, QWidget, QHBoxLayout
-from PyQt5.QtCore import QTimer
+from brainflow.board_shim import BoardShim
+from PyQt5.QtWidgets import QApplication, QPushButton, QVBoxLayout, QWidget, QHBoxLayout, QShortcut
+from PyQt5.QtGui import QKeySequence
 from PyQt5.QtOpenGL import QGLFormat
 import json
+from presets import PRESET_CONFIGS, PRESET_MAP, SPECTROGRAM_PRESETS
+from spectrogram import SpectrogramPanel
+from buffers import ChannelRing
+from pipeline import Plan
+from session_manager import SessionManager, emotibit_params
+from markers import build_index
+from pacing import FramePacer
+from axis_range import SlidingMinMax, HysteresisRange
+from quality import QualityMonitor
 
 class Graph:
-    def __init__(self, board_shim):
+    def __init__(self, board_shim, on_data=None):
         self.board_id = board_shim.get_board_id()
         self.board_shim = board_shim
+        # update() drains the board, so stream liveness has to be reported
+        # (SessionManager.saw_data) rather than read from its buffer
+        self.on_data = on_data
         self.current_preset = 'DEFAULT'
 
         # Configure OpenGL format
@@ -26,61 +38,11 @@ class Graph:
             enableExperimental=True
         )
 
-        # Channel configurations for different presets
-        self.preset_configs = {
-            'DEFAULT': {
-                'Accelerometer': {
-                    'channels': [1,2,3], 
-                    'detrend': True,
-                    'colors': ['r', 'g', 'b'],
-                    'names': ['X', 'Y', 'Z']
-                },
-                'Gyroscope': {
-                    'channels': [4,5,6], 
-                    'detrend': True,
-                    'colors': ['r', 'g', 'b'],
-                    'names': ['X', 'Y', 'Z']
-                },
-                'Magnetometer': {
-                    'channels': [7,8,9], 
-                    'detrend': True,
-                    'colors': ['r', 'g', 'b'],
-                    'names': ['X', 'Y', 'Z']
-                }
-            },
-            'AUXILIARY': {
-                'PPG_IR': {
-                    'channels': [1], 
-                    'detrend': True,
-                    'colors': ['r'],
-                    'names': ['IR']
-                },
-                'PPG_Red': {
-                    'channels': [2], 
-                    'detrend': True,
-                    'colors': ['darkred'],
-                    'names': ['Red']
-                },
-                'PPG_Green': {
-                    'channels': [3], 
-                    'detrend': True,
-                    'colors': ['g'],
-                    'names': ['Green']
-                }
-            },
-            'ANCILLARY': {
-                'Biometrics': {
-                    'channels': [1,2], 
-                    'detrend': False,
-                    'colors': ['y', 'c'],
-                    'names': ['EDA', 'Temp']
-                }
-            }
-        }
+        self.preset_configs = PRESET_CONFIGS
 
         self.sensors = self.preset_configs['DEFAULT']
-        self.window_size = 200
-        self.update_speed_ms = 20  # 50Hz update
+        self.window_size = 8  # seconds, converted to samples per preset
+        self.display_hz = 60  # upper bound, the pacer renders only when data arrives
 
         # Setup GUI
         self.app = QApplication([])
@@ -116,28 +78,36 @@ class Graph:
 
         self._init_timeseries()
 
-        # Update timer
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update)
-        self.timer.start(self.update_speed_ms)
+        # Number keys 1-9 drop a marker with that value into the stream
+        self.shortcuts = []
+        for value in range(1, 10):
+            shortcut = QShortcut(QKeySequence(str(value)), self.main_window)
+            shortcut.activated.connect(lambda v=value: self.insert_marker(v))
+            self.shortcuts.append(shortcut)
+
+        # Adaptive update pacing
+        self.timer = FramePacer(self.update, self._has_new_data, self.display_hz, self.sampling_rate, on_rate=self._show_rate)
+        self.timer.start()
 
         self.main_window.show()
         self.app.exec_()
 
-    def change_preset(self, preset_name):
-        preset_map = {
-            'DEFAULT': BrainFlowPresets.DEFAULT_PRESET,
-            'AUXILIARY': BrainFlowPresets.AUXILIARY_PRESET,
-            'ANCILLARY': BrainFlowPresets.ANCILLARY_PRESET
-        }
+    def insert_marker(self, value):
+        try:
+            self.board_shim.insert_marker(value)
+            print(f"Inserted marker {value}")
+        except Exception as e:
+            print(f"Error inserting marker: {e}")
 
+    def change_preset(self, preset_name):
         try:
-            preset_json = json.dumps({'preset': str(int(preset_map[preset_name]))})
+            preset_json = json.dumps({'preset': str(int(PRESET_MAP[preset_name]))})
             self.board_shim.config_board(preset_json)
             self.current_preset = preset_name
             self.sensors = self.preset_configs[preset_name]
             self.win.clear()
             self._init_timeseries()
+            self.timer.set_data_rate(self.sampling_rate)
             print(f"Changed to preset {preset_name}")
         except Exception as e:
             print(f"Error changing preset: {e}")
@@ -145,6 +115,21 @@ class Graph:
     def _init_timeseries(self):
         self.plots = {}
         self.curves = {}
+        self.spectrograms = {}
+        self.extremes = {}
+        self.ranges = {}
+        preset = PRESET_MAP[self.current_preset]
+        sampling_rate = BoardShim.get_sampling_rate(self.board_id, preset)
+        self.sampling_rate = sampling_rate
+        self.num_points = int(self.window_size * sampling_rate)
+        self.time_axis = (np.arange(self.num_points) - (self.num_points - 1)) / sampling_rate
+        # Preallocated window refilled from drained samples, so a frame only
+        # allocates the array BrainFlow returns for what arrived since the last one
+        self.ring = ChannelRing(self.sensors, self.num_points)
+        self.plan = Plan(self.sensors, sampling_rate)
+        # Channel health from the samples as they arrive; bad channels skip feature stages
+        self.quality = QualityMonitor(self.sensors, sampling_rate)
+        self.titles = {}
 
         for row, (sensor_name, sensor_info) in enumerate(self.sensors.items()):
             p = self.win.addPlot(row=row, col=0)
@@ -152,14 +137,16 @@ class Graph:
             p.setClipToView(True)
             p.showGrid(x=True, y=True, alpha=0.3)
             p.setLabel('left', sensor_name)
-            p.setLabel('bottom', 'Samples' if row == len(self.sensors)-1 else '')
+            p.setLabel('bottom', 'Time (s)' if row == len(self.sensors)-1 else '')
             p.getAxis('left').setPen('k')
             p.getAxis('bottom').setPen('k')
             p.addLegend()
 
             vb = p.getViewBox()
             vb.setAspectLocked(False)
-            vb.enableAutoRange(axis='y')
+            # Window min/max per channel are tracked as samples arrive instead of autorange scans
+            self.ranges[sensor_name] = HysteresisRange(vb)
+            self.extremes[sensor_name] = [SlidingMinMax(self.num_points) for _ in sensor_info['channels']]
 
             self.curves[sensor_name] = []
             for name, color in zip(sensor_info['names'], sensor_info['colors']):
@@ -173,48 +160,109 @@ class Graph:
 
             self.plots[sensor_name] = p
 
+            # Frequency-domain view next to the time series
+            if self.current_preset in SPECTROGRAM_PRESETS:
+                sp = self.win.addPlot(row=row, col=1)
+                sp.setLabel('bottom', 'Time (s)' if row == len(self.sensors)-1 else '')
+                sp.getAxis('left').setPen('k')
+                sp.getAxis('bottom').setPen('k')
+                self.spectrograms[sensor_name] = SpectrogramPanel(
+                    sp, len(sensor_info['channels']), sampling_rate)
+
             if row < len(self.sensors)-1:
                 self.win.nextRow()
 
+    def _has_new_data(self):
+        # update() drains the buffer, so any buffered sample is new
+        try:
+            return self.board_shim.get_board_data_count(PRESET_MAP[self.current_preset]) > 0
+        except Exception:
+            return False
+
+    def _show_rate(self, rate):
+        self.main_window.setWindowTitle(f'EmotiBit Data Viewer ({rate:.0f} FPS)')
+
     def update(self):
         try:
-            data = self.board_shim.get_current_board_data(self.window_size)
-            if data.size > 0:
-                for sensor_name, sensor_info in self.sensors.items():
-                    for idx, channel in enumerate(sensor_info['channels']):
-                        if channel < data.shape[0]:
-                            channel_data = data[channel]
-                            if len(channel_data) > 0:
-                                if sensor_info['detrend'] and not np.allclose(channel_data, 0):
-                                    DataFilter.detrend(channel_data, DetrendOperations.CONSTANT.value)
-                                self.curves[sensor_name][idx].setData(channel_data)
+            new = self.board_shim.get_board_data(preset=PRESET_MAP[self.current_preset])
+            if new.shape[1] > 0:
+                if self.on_data is not None:
+                    self.on_data()
+                self.ring.append(new)
+                self._update_spectrograms(new)
+                self.quality.push(new)
+                self.ring.process(self.plan, self.quality.active)
+                time_axis = self.time_axis[-self.ring.length:]
+                for sensor_name in self.sensors:
+                    for idx, channel_data in enumerate(self.ring.sensor(sensor_name)):
+                        self.curves[sensor_name][idx].setData(time_axis, channel_data)
+                self._update_ranges(new)
+                self._show_titles()
         except Exception as e:
             print(f"Update error: {e}")
 
+    def _update_ranges(self, new):
+        # Extremes are tracked on raw samples; shift them by the detrend offsets
+        for sensor_name, sensor_info in self.sensors.items():
+            if not self.plan.shift_only[sensor_name]:
+                # Filtered output has no fixed relation to the raw samples
+                block = self.ring.sensor(sensor_name)
+                self.ranges[sensor_name].update(float(block.min()), float(block.max()))
+                continue
+            offsets = self.ring.offsets[self.ring.slices[sensor_name]]
+            bounds = []
+            for tracker, channel, offset in zip(self.extremes[sensor_name], sensor_info['channels'], offsets):
+                if new.shape[1] and channel < new.shape[0]:
+                    tracker.push(new[channel])
+                if tracker.min is not None:
+                    bounds.append((float(tracker.min - offset), float(tracker.max - offset)))
+            self.ranges[sensor_name].update_many(bounds)
+
+    def _show_titles(self):
+        """Quality badges per channel, then the sensor's features over its good channels"""
+        for sensor_name, features in self.plan.features.items():
+            parts = [self.quality.badges(sensor_name)]
+            for name, values in features.items():
+                good = values[~np.isnan(values)]
+                parts.append(f'{name} {good.mean():.3g}' if good.size else f'{name} -')
+            text = '&nbsp;&nbsp;'.join(parts)
+            # Only touch the title item when the text changes
+            if self.titles.get(sensor_name) != text:
+                self.titles[sensor_name] = text
+                self.plots[sensor_name].setTitle(text, size='9pt')
+
+    def _update_spectrograms(self, new):
+        if not self.spectrograms or new.shape[1] == 0:
+            return
+        for sensor_name, panel in self.spectrograms.items():
+            panel.push(new[self.sensors[sensor_name]['channels']])
+
 def main():
     BoardShim.enable_dev_board_logger()
     logging.basicConfig(level=logging.DEBUG)
 
-    params = BrainFlowInputParams()
-    params.ip_address = '192.168.229.255'
-    params.ip_port = 3132
-    params.timeout = 15
+    # Optional session directory to record every preset (and markers) into
+    record_to = sys.argv[1] if len(sys.argv) > 1 else None
 
-    board_shim = None
+    # Connects in the background and reconnects a dropped stream in place
+    manager = SessionManager({'emotibit': emotibit_params('192.168.229.255', 3132, 15)}, record_to=record_to)
     try:
-        board_shim = BoardShim(BoardIds.EMOTIBIT_BOARD, params)
-        board_shim.prepare_session()
-        board_shim.config_board('{"preset":"0"}')  # Start with DEFAULT preset
-        board_shim.start_stream(65536)
+        boards = manager.start()
+        if 'emotibit' not in boards:
+            logging.error(f'Could not connect: {manager.stats()}')
+            return
 
-        Graph(board_shim)
+        Graph(boards['emotibit'], on_data=lambda: manager.saw_data('emotibit'))
 
     except Exception as e:
         logging.error(f'Error: {str(e)}', exc_info=True)
     finally:
-        if board_shim and board_shim.is_prepared():
-            logging.info('Releasing session')
-            board_shim.release_session()
+        logging.info('Releasing session')
+        manager.stop()
+        if record_to is not None:
+            count = build_index(manager.session_path('emotibit'))
+            if count is not None:
+                logging.info(f'Indexed {count} markers')
 
 if __name__ == '__main__':
     main()
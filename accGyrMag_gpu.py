@@ -1,16 +1,24 @@
 import logging
-import numpy as np
+import sys
 import pyqtgraph as pg
-from brainflow.board_shim import BoardShim, BrainFlowInputParams, BoardIds
-from brainflow.data_filter import DataFilter, DetrendOperations
-from PyQt5.QtWidgets import QApplication
-from PyQt5.QtCore import QTimer
+from brainflow.board_shim import BoardShim
+from PyQt5.QtWidgets import QApplication, QShortcut
+from PyQt5.QtGui import QKeySequence
 from PyQt5.QtOpenGL import QGLFormat
+from buffers import ChannelSubset
+from gl_curve import GLRingCurve
+from pacing import FramePacer
+from axis_range import HysteresisRange
+from session_manager import SessionManager, emotibit_params
+from markers import build_index
 
 class Graph:
-    def __init__(self, board_shim):
+    def __init__(self, board_shim, on_data=None):
         self.board_id = board_shim.get_board_id()
         self.board_shim = board_shim
+        # update() drains the board, so stream liveness has to be reported
+        # (SessionManager.saw_data) rather than read from its buffer
+        self.on_data = on_data
 
         # Configure OpenGL format
         fmt = QGLFormat()
@@ -45,13 +53,16 @@ class Graph:
         }
 
         # Display configuration
-        self.sampling_rate = 100
-        self.update_speed_ms = 16  # ~60 FPS
-        self.window_size = 4
-        self.num_points = self.window_size * self.sampling_rate
+        self.sampling_rate = BoardShim.get_sampling_rate(self.board_id)
+        self.display_hz = 60  # upper bound, the pacer renders only when data arrives
+        self.window_size = 4  # seconds
+        self.num_points = int(self.window_size * self.sampling_rate)
 
         print(f"Window size: {self.window_size}s at {self.sampling_rate}Hz")
 
+        # Only the plotted rows, as float32
+        self.subset = ChannelSubset(self.sensors, self.num_points)
+
         # Setup GUI
         self.app = QApplication([])
         self.win = pg.GraphicsLayoutWidget(show=True, title='EmotiBit IMU Data (GPU Accelerated)')
@@ -60,17 +71,31 @@ class Graph:
 
         self._init_timeseries()
 
-        # Update timer
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update)
-        self.timer.start(self.update_speed_ms)
+        # Number keys 1-9 drop a marker with that value into the stream
+        self.shortcuts = []
+        for value in range(1, 10):
+            shortcut = QShortcut(QKeySequence(str(value)), self.win)
+            shortcut.activated.connect(lambda v=value: self.insert_marker(v))
+            self.shortcuts.append(shortcut)
+
+        # Adaptive update pacing
+        self.timer = FramePacer(self.update, self._has_new_data, self.display_hz, self.sampling_rate, on_rate=self._show_rate)
+        self.timer.start()
 
         self.win.show()
         self.app.exec_()
 
+    def insert_marker(self, value):
+        try:
+            self.board_shim.insert_marker(value)
+            print(f"Inserted marker {value}")
+        except Exception as e:
+            print(f"Error inserting marker: {e}")
+
     def _init_timeseries(self):
         self.plots = {}
         self.curves = {}
+        self.ranges = {}
 
         for row, (sensor_name, sensor_info) in enumerate(self.sensors.items()):
             # Create plot for this sensor
@@ -87,17 +112,19 @@ class Graph:
             # Enable hardware acceleration for ViewBox
             vb = p.getViewBox()
             vb.setAspectLocked(False)
-            vb.enableAutoRange(axis='y')
+            # Curves track their own min/max, so the y range is set from those
+            self.ranges[sensor_name] = HysteresisRange(vb)
 
-            # Create GPU-accelerated curves
+            # Create GPU-accelerated curves, each with its own persistent vertex buffer
             self.curves[sensor_name] = []
             for name, color in zip(sensor_info['names'], sensor_info['colors']):
-                curve = p.plot(
+                curve = GLRingCurve(
+                    self.num_points,
+                    self.window_size,
                     pen=pg.mkPen(color=color, width=1.5),
-                    name=f'{name}',
-                    antialias=True,
-                    skipFiniteCheck=True
+                    name=f'{name}'
                 )
+                p.addItem(curve)
                 self.curves[sensor_name].append(curve)
 
             self.plots[sensor_name] = p
@@ -105,23 +132,30 @@ class Graph:
             if row < len(self.sensors)-1:
                 self.win.nextRow()
 
+    def _has_new_data(self):
+        # update() drains the buffer, so any buffered sample is new
+        try:
+            return self.board_shim.get_board_data_count() > 0
+        except Exception:
+            return False
+
+    def _show_rate(self, rate):
+        self.win.setWindowTitle(f'EmotiBit IMU Data (GPU Accelerated, {rate:.0f} FPS)')
+
     def update(self):
         try:
-            data = self.board_shim.get_current_board_data(self.num_points)
+            # Drain only the samples that arrived since the last frame;
+            # the curves keep the rest of the window on the GPU
+            data = self.board_shim.get_board_data()
             if data.size > 0:
-                for sensor_name, sensor_info in self.sensors.items():
-                    for idx, channel in enumerate(sensor_info['channels']):
-                        if channel < data.shape[0]:
-                            channel_data = data[channel]
-                            if len(channel_data) > 0:
-                                if not np.allclose(channel_data, 0):
-                                    DataFilter.detrend(channel_data, DetrendOperations.CONSTANT.value)
-                                time_axis = np.linspace(0, self.window_size, len(channel_data))
-                                self.curves[sensor_name][idx].setData(
-                                    time_axis,
-                                    channel_data,
-                                    connect='finite'
-                                )
+                if self.on_data is not None:
+                    self.on_data()
+                self.subset.compact(data)
+                for sensor_name in self.sensors:
+                    for idx, channel_data in enumerate(self.subset.sensor(sensor_name)):
+                        self.curves[sensor_name][idx].push(channel_data)
+                    self.ranges[sensor_name].update_many(
+                        curve.dataBounds(1) for curve in self.curves[sensor_name])
         except Exception as e:
             print(f"Update error: {e}")
 
@@ -129,26 +163,28 @@ def main():
     BoardShim.enable_dev_board_logger()
     logging.basicConfig(level=logging.DEBUG)
 
-    params = BrainFlowInputParams()
-    params.ip_address = '192.168.229.255'
-    params.ip_port = 3132
-    params.timeout = 15
+    # Optional session directory to record every preset (and markers) into
+    record_to = sys.argv[1] if len(sys.argv) > 1 else None
 
-    board_shim = None
+    # Connects in the background and reconnects a dropped stream in place
+    manager = SessionManager({'emotibit': emotibit_params('192.168.229.255', 3132, 15)}, record_to=record_to)
     try:
-        board_shim = BoardShim(BoardIds.EMOTIBIT_BOARD, params)
-        board_shim.prepare_session()
-        board_shim.config_board('{"preset":"0"}')
-        board_shim.start_stream(65536)
+        boards = manager.start()
+        if 'emotibit' not in boards:
+            logging.error(f'Could not connect: {manager.stats()}')
+            return
 
-        Graph(board_shim)
+        Graph(boards['emotibit'], on_data=lambda: manager.saw_data('emotibit'))
 
     except Exception as e:
         logging.error(f'Error: {str(e)}', exc_info=True)
     finally:
-        if board_shim and board_shim.is_prepared():
-            logging.info('Releasing session')
-            board_shim.release_session()
+        logging.info('Releasing session')
+        manager.stop()
+        if record_to is not None:
+            count = build_index(manager.session_path('emotibit'))
+            if count is not None:
+                logging.info(f'Indexed {count} markers')
 
 if __name__ == '__main__':
     main()
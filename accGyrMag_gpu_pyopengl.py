@@ -1,15 +1,20 @@
 import logging
 import numpy as np
 import pyqtgraph as pg
-from brainflow.board_shim import BoardShim, BrainFlowInputParams, BoardIds
-from brainflow.data_filter import DataFilter, DetrendOperations
+from brainflow.board_shim import BoardShim
 from PyQt5.QtWidgets import QApplication
-from PyQt5.QtCore import QTimer
+from buffers import ChannelRing
+from pipeline import Plan
+from pacing import FramePacer
+from session_manager import SessionManager, emotibit_params
 
 class Graph:
-    def __init__(self, board_shim):
+    def __init__(self, board_shim, on_data=None):
         self.board_id = board_shim.get_board_id()
         self.board_shim = board_shim
+        # update() drains the board, so stream liveness has to be reported
+        # (SessionManager.saw_data) rather than read from its buffer
+        self.on_data = on_data
 
         # Disable hardware acceleration
         pg.setConfigOptions(
@@ -38,13 +43,18 @@ class Graph:
         }
 
         # Display configuration
-        self.sampling_rate = 100
-        self.update_speed_ms = 50  # Reduced to 20 FPS for better CPU usage
-        self.window_size = 4
-        self.num_points = self.window_size * self.sampling_rate
+        self.sampling_rate = BoardShim.get_sampling_rate(self.board_id)
+        self.display_hz = 20  # upper bound kept low for CPU usage, the pacer renders only when data arrives
+        self.window_size = 4  # seconds
+        self.num_points = int(self.window_size * self.sampling_rate)
 
         print(f"Window size: {self.window_size}s at {self.sampling_rate}Hz")
 
+        # Only the plotted rows, as float32, in buffers reused every frame
+        self.ring = ChannelRing(self.sensors, self.num_points)
+        self.plan = Plan(self.sensors, self.sampling_rate)
+        self.time_axis = np.linspace(0, self.window_size, self.num_points, dtype=np.float32)
+
         # Setup GUI
         self.app = QApplication([])
         self.win = pg.GraphicsLayoutWidget(show=True, title='EmotiBit IMU Data')
@@ -53,10 +63,9 @@ class Graph:
 
         self._init_timeseries()
 
-        # Update timer
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update)
-        self.timer.start(self.update_speed_ms)
+        # Adaptive update pacing
+        self.timer = FramePacer(self.update, self._has_new_data, self.display_hz, self.sampling_rate, on_rate=self._show_rate)
+        self.timer.start()
 
         self.win.show()
         self.app.exec_()
@@ -92,22 +101,31 @@ class Graph:
             if row < len(self.sensors)-1:
                 self.win.nextRow()
 
+    def _has_new_data(self):
+        # update() drains the buffer, so any buffered sample is new
+        try:
+            return self.board_shim.get_board_data_count() > 0
+        except Exception:
+            return False
+
+    def _show_rate(self, rate):
+        self.win.setWindowTitle(f'EmotiBit IMU Data ({rate:.0f} FPS)')
+
     def update(self):
         try:
-            data = self.board_shim.get_current_board_data(self.num_points)
-            if data.size > 0:
-                for sensor_name, sensor_info in self.sensors.items():
-                    for idx, channel in enumerate(sensor_info['channels']):
-                        if channel < data.shape[0]:
-                            channel_data = data[channel]
-                            if len(channel_data) > 0:
-                                if not np.allclose(channel_data, 0):
-                                    DataFilter.detrend(channel_data, DetrendOperations.CONSTANT.value)
-                                time_axis = np.linspace(0, self.window_size, len(channel_data))
-                                self.curves[sensor_name][idx].setData(
-                                    time_axis,
-                                    channel_data
-                                )
+            # Only the new samples come from BrainFlow; the window and its
+            # processed copy are updated in place
+            if self.ring.drain(self.board_shim) > 0:
+                if self.on_data is not None:
+                    self.on_data()
+                self.ring.process(self.plan)
+                time_axis = self.time_axis[-self.ring.length:]
+                for sensor_name in self.sensors:
+                    for idx, channel_data in enumerate(self.ring.sensor(sensor_name)):
+                        self.curves[sensor_name][idx].setData(
+                            time_axis,
+                            channel_data
+                        )
         except Exception as e:
             print(f"Update error: {e}")
 
@@ -115,26 +133,21 @@ def main():
     BoardShim.enable_dev_board_logger()
     logging.basicConfig(level=logging.DEBUG)
 
-    params = BrainFlowInputParams()
-    params.ip_address = '192.168.229.255'
-    params.ip_port = 3132
-    params.timeout = 15
-
-    board_shim = None
+    # Connects in the background and reconnects a dropped stream in place
+    manager = SessionManager({'emotibit': emotibit_params('192.168.229.255', 3132, 15)})
     try:
-        board_shim = BoardShim(BoardIds.EMOTIBIT_BOARD, params)
-        board_shim.prepare_session()
-        board_shim.config_board('{"preset":"0"}')
-        board_shim.start_stream(65536)
+        boards = manager.start()
+        if 'emotibit' not in boards:
+            logging.error(f'Could not connect: {manager.stats()}')
+            return
 
-        Graph(board_shim)
+        Graph(boards['emotibit'], on_data=lambda: manager.saw_data('emotibit'))
 
     except Exception as e:
         logging.error(f'Error: {str(e)}', exc_info=True)
     finally:
-        if board_shim and board_shim.is_prepared():
-            logging.info('Releasing session')
-            board_shim.release_session()
+        logging.info('Releasing session')
+        manager.stop()
 
 if __name__ == '__main__':
     main()
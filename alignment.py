@@ -0,0 +1,94 @@
+import numpy as np
+from brainflow.board_shim import BoardShim
+from presets import BOARD_ID, PRESET_MAP, sampling_rate, window_points
+from session import timestamp_channel
+
+
+class AsOfJoin:
+    """Streaming as-of join of the presets onto the timestamps of one of them
+
+    Every row of the base preset is paired with the latest row of each
+    other preset at or before its timestamp, or NaN when that row is older
+    than the preset's tolerance (two sample periods by default). Rows are
+    only emitted once every other preset has reached their timestamp, so a
+    row is never joined against data that is still arriving; a preset that
+    stalls for longer than `lookback` seconds stops holding the join back
+    and shows up as NaN instead. Buffers keep about 2 x lookback seconds.
+    """
+
+    def __init__(self, base='AUXILIARY', presets=None, tolerance=None, lookback=2.0):
+        self.base = base
+        self.presets = list(presets or PRESET_MAP)
+        if base not in self.presets:
+            self.presets.insert(0, base)
+        self.others = [name for name in self.presets if name != base]
+        self.tolerance = {
+            name: tolerance if tolerance is not None else 2.0 / sampling_rate(name)
+            for name in self.presets
+        }
+        self.lookback = lookback
+        self.channels = {name: timestamp_channel(name) for name in self.presets}
+        self.buffers = {name: None for name in self.presets}
+        self.newest = {name: -np.inf for name in self.presets}
+
+    def push(self, preset_name, data):
+        """Add a board array of one preset; rows already seen are skipped"""
+        channel = self.channels[preset_name]
+        if data.size == 0:
+            return
+        new = data[:, data[channel] > self.newest[preset_name]]
+        if new.shape[1] == 0:
+            return
+        # Board timestamps can step back after packet loss
+        new = new[:, np.argsort(new[channel], kind='stable')]
+        self.newest[preset_name] = new[channel, -1]
+
+        buf = self.buffers[preset_name]
+        buf = new if buf is None else np.hstack((buf, new))
+        keep = np.searchsorted(buf[channel], self.newest[preset_name] - 2 * self.lookback, side='left')
+        self.buffers[preset_name] = buf[:, keep:]
+
+    def pull(self, board_shim):
+        """Push the newest `lookback` seconds of every preset from a streaming board"""
+        for name in self.presets:
+            data = board_shim.get_current_board_data(window_points(name, self.lookback), PRESET_MAP[name])
+            self.push(name, data)
+
+    def poll(self):
+        """(times, {preset_name: data}) for the base rows that are ready, or None
+
+        Every data array has the preset's own row layout and one column per
+        base row; the as-of lookup is a single searchsorted per preset.
+        """
+        base = self.buffers[self.base]
+        if base is None or base.shape[1] == 0:
+            return None
+        base_times = base[self.channels[self.base]]
+        watermark = min(self.newest[name] for name in self.others) if self.others else np.inf
+        watermark = max(watermark, self.newest[self.base] - self.lookback)
+        n = np.searchsorted(base_times, watermark, side='right')
+        if n == 0:
+            return None
+
+        times = base_times[:n]
+        frame = {self.base: base[:, :n]}
+        for name in self.others:
+            frame[name] = self._lookup(name, times)
+        self.buffers[self.base] = base[:, n:]
+        return times, frame
+
+    def _lookup(self, preset_name, times):
+        buf = self.buffers[preset_name]
+        if buf is None or buf.shape[1] == 0:
+            rows = BoardShim.get_num_rows(BOARD_ID, PRESET_MAP[preset_name])
+            return np.full((rows, len(times)), np.nan)
+        stamps = buf[self.channels[preset_name]]
+        idx = np.searchsorted(stamps, times, side='right') - 1
+        safe = np.maximum(idx, 0)
+        valid = (idx >= 0) & (times - stamps[safe] <= self.tolerance[preset_name])
+        joined = buf[:, safe]
+        joined[:, ~valid] = np.nan
+
+        # Rows before the last one used can no longer match a later base row
+        self.buffers[preset_name] = buf[:, safe[-1]:]
+        return joined
@@ -1,37 +1,54 @@
 import logging
+import sys
 import pyqtgraph as pg
-from brainflow.board_shim import BoardShim, BrainFlowInputParams, BoardIds, BrainFlowPresets
-from brainflow.data_filter import DataFilter, DetrendOperations
-from PyQt5.QtWidgets import QApplication, QPushButton, QVBoxLayout, QWidget, QHBoxLayout
+from brainflow.board_shim import BoardShim, BrainFlowPresets
+from PyQt5.QtWidgets import QApplication, QPushButton, QVBoxLayout, QWidget, QHBoxLayout, QShortcut
+from PyQt5.QtGui import QKeySequence
 from PyQt5.QtCore import QTimer
 import numpy as np
 import json
+from buffers import ChannelSubset
+from pipeline import Plan
+from pacing import FramePacer
+from presets import PRESET_CONFIGS, PRESET_MAP, sampling_rate, window_points
+from alignment import AsOfJoin
+from session_manager import SessionManager, emotibit_params
+from markers import build_index
 
 class EmotibitVisualizer:
-    def __init__(self):
+    def __init__(self, board):
+        self.board = board
         self.current_preset = 0
-        self.window_size = 200  # Increased window size
+        self.window_size = 8  # seconds, converted to samples per preset
         self.auto_switch = True
 
-        # Initialize data buffers for each preset
+        self.setup_board()
+
+        # Initialize compact float32 buffers holding only the plotted channels of each preset
+        self.num_points = {
+            preset: window_points(preset, self.window_size)
+            for preset in self.channels_map
+        }
+        self.time_axes = {
+            preset: (np.arange(n) - (n - 1)) / sampling_rate(preset)
+            for preset, n in self.num_points.items()
+        }
         self.preset_data = {
-            'DEFAULT': np.zeros((12, self.window_size)),
-            'AUXILIARY': np.zeros((12, self.window_size)),
-            'ANCILLARY': np.zeros((12, self.window_size))
+            preset: ChannelSubset(sensors, self.num_points[preset])
+            for preset, sensors in self.channels_map.items()
+        }
+        self.plans = {
+            preset: Plan(sensors, sampling_rate(preset))
+            for preset, sensors in self.channels_map.items()
         }
 
-        self.setup_board()
+        # PPG rows joined with the IMU and EDA/temp rows current at their timestamps
+        self.join = AsOfJoin(base='AUXILIARY')
+        self.merged = None
+
         self.setup_gui()
 
     def setup_board(self):
-        params = BrainFlowInputParams()
-        params.ip_address = '192.168.229.255'
-        params.ip_port = 3132
-        params.timeout = 15
-
-        self.board = BoardShim(BoardIds.EMOTIBIT_BOARD, params)
-        self.board.prepare_session()
-
         # Channel mapping with colors and names
         self.channels_map = {
             'DEFAULT': {
@@ -72,7 +89,6 @@ class EmotibitVisualizer:
             }
         }
 
-        self.board.start_stream(65536)
         self.switch_preset('DEFAULT')
 
     def switch_preset(self, preset_name):
@@ -126,7 +142,7 @@ class EmotibitVisualizer:
                 p = self.win.addPlot(row=row, col=0)
                 p.showGrid(x=True, y=True)
                 p.setLabel('left', sensor)
-                p.setLabel('bottom', 'Samples')
+                p.setLabel('bottom', 'Time (s)')
                 p.addLegend()
 
                 self.curves[f"{preset}_{sensor}"] = []
@@ -136,15 +152,30 @@ class EmotibitVisualizer:
 
                 row += 1
 
+        # Number keys 1-9 drop a marker with that value into the stream
+        self.shortcuts = []
+        for value in range(1, 10):
+            shortcut = QShortcut(QKeySequence(str(value)), self.main_widget)
+            shortcut.activated.connect(lambda v=value: self.insert_marker(v))
+            self.shortcuts.append(shortcut)
+
         # Timers
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update)
-        self.timer.start(20)  # 50Hz update
+        # Redraw only after cycle_preset has fetched something new
+        self.dirty = False
+        self.timer = FramePacer(self.update, self._has_new_data, display_hz=50)
+        self.timer.start()
 
         self.preset_timer = QTimer()
         self.preset_timer.timeout.connect(self.cycle_preset)
         self.preset_timer.start(1000)  # 1Hz preset switch
 
+    def insert_marker(self, value):
+        try:
+            self.board.insert_marker(value)
+            print(f"Inserted marker {value}")
+        except Exception as e:
+            print(f"Error inserting marker: {e}")
+
     def toggle_auto_switch(self):
         self.auto_switch = not self.auto_switch
         self.auto_switch_button.setText(f'Auto Switch: {"ON" if self.auto_switch else "OFF"}')
@@ -154,7 +185,25 @@ class EmotibitVisualizer:
         self.auto_switch_button.setText('Auto Switch: OFF')
         self.switch_preset(preset)
 
+    def update_join(self):
+        try:
+            self.join.pull(self.board)
+            merged = self.join.poll()
+        except Exception as e:
+            print(f"Error joining presets: {e}")
+            return
+        if merged is None:
+            return
+        self.merged = merged
+
+        # Share of PPG samples taken while the wearer was still
+        _, frame = merged
+        accel = frame['DEFAULT'][PRESET_CONFIGS['DEFAULT']['Accelerometer']['channels']]
+        still = np.abs(np.sqrt((accel ** 2).sum(axis=0)) - 1.0) < 0.1
+        self.main_widget.setWindowTitle(f'EmotiBit ({still.mean():.0%} of PPG motion-free)')
+
     def cycle_preset(self):
+        self.update_join()
         if not self.auto_switch:
             return
 
@@ -163,44 +212,62 @@ class EmotibitVisualizer:
         self.switch_preset(presets[self.current_preset])
 
         try:
-            data = self.board.get_current_board_data(self.window_size)
+            preset = presets[self.current_preset]
+            data = self.board.get_current_board_data(self.num_points[preset], PRESET_MAP[preset])
             if data.size > 0:
-                self.preset_data[presets[self.current_preset]] = data
+                self.preset_data[preset].compact(data)
+                self.preset_data[preset].process(self.plans[preset])
+                self.dirty = True
         except Exception as e:
             print(f"Error getting data: {e}")
 
+    def _has_new_data(self):
+        dirty, self.dirty = self.dirty, False
+        return dirty
+
     def update(self):
         for preset in self.channels_map:
-            data = self.preset_data[preset]
-            if data is None or np.all(data == 0):
+            subset = self.preset_data[preset]
+            if subset.length == 0:
                 continue
 
-            for sensor, info in self.channels_map[preset].items():
+            for sensor in self.channels_map[preset]:
                 curves = self.curves[f"{preset}_{sensor}"]
-                for idx, channel in enumerate(info['channels']):
-                    if channel < data.shape[0]:
-                        channel_data = data[channel]
-                        if info['detrend'] and not np.allclose(channel_data, 0):
-                            DataFilter.detrend(channel_data, DetrendOperations.CONSTANT.value)
-                        curves[idx].setData(channel_data)
-
-    def cleanup(self):
-        if self.board.is_prepared():
-            self.board.release_session()
+                time_axis = self.time_axes[preset][-subset.length:]
+                for idx, channel_data in enumerate(subset.sensor(sensor)):
+                    curves[idx].setData(time_axis, channel_data)
 
     def run(self):
-        try:
-            self.main_widget.show()
-            self.app.exec_()
-        finally:
-            self.cleanup()
+        self.main_widget.show()
+        self.app.exec_()
 
 def main():
     BoardShim.enable_dev_board_logger()
     logging.basicConfig(level=logging.DEBUG)
 
-    visualizer = EmotibitVisualizer()
-    visualizer.run()
+    # Optional session directory to record every preset (and markers) into
+    record_to = sys.argv[1] if len(sys.argv) > 1 else None
+
+    # Connects in the background and reconnects a dropped stream in place;
+    # the visualizer only reads the newest samples, so the watcher sees them
+    manager = SessionManager({'emotibit': emotibit_params('192.168.229.255', 3132, 15)}, record_to=record_to)
+    try:
+        boards = manager.start()
+        if 'emotibit' not in boards:
+            logging.error(f'Could not connect: {manager.stats()}')
+            return
+
+        EmotibitVisualizer(boards['emotibit']).run()
+
+    except Exception as e:
+        logging.error(f'Error: {str(e)}', exc_info=True)
+    finally:
+        logging.info('Releasing session')
+        manager.stop()
+        if record_to is not None:
+            count = build_index(manager.session_path('emotibit'))
+            if count is not None:
+                logging.info(f'Indexed {count} markers')
 
 if __name__ == '__main__':
     main()
@@ -3,6 +3,7 @@ import numpy as np
 from brainflow.board_shim import BoardShim, BrainFlowInputParams, BoardIds
 import time
 import sys
+from quality import SignalQuality
 
 def analyze_board():
     BoardShim.enable_dev_board_logger()
@@ -37,6 +38,12 @@ def analyze_board():
         num_channels = data.shape[0]
         print(f"\nFound {num_channels} channels")
 
+        # Same metrics the viewers keep up to date, over the whole snapshot
+        rate = BoardShim.get_sampling_rate(BoardIds.EMOTIBIT_BOARD.value)
+        quality = SignalQuality(num_channels, rate, window=data.shape[1] / rate)
+        quality.push(data)
+        metrics = quality.metrics()
+
         for i in range(num_channels):
             channel_data = data[i]
 
@@ -55,6 +62,8 @@ def analyze_board():
             print(f"  Std Dev: {std:.4f}")
             print(f"  Range: [{min_val:.4f}, {max_val:.4f}]")
             print(f"  First few values: {channel_data[:5]}")
+            print(f"  Quality: flatline {metrics['flatline'][i]}, clipping {metrics['clipping'][i]:.1%}, "
+                  f"SNR {metrics['snr_db'][i]:.1f} dB")
 
             # Try to identify the type of data
             if is_active:
@@ -0,0 +1,85 @@
+from collections import deque
+
+
+class SlidingMinMax:
+    """Min and max of the last `window` samples, O(1) amortised per sample
+
+    Two monotonic deques of (sample index, value): the min deque keeps
+    increasing values and the max deque decreasing ones, so the extremes
+    are always at the front and expire as the window slides past them.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.count = 0
+        self.mins = deque()
+        self.maxs = deque()
+
+    def push(self, values):
+        for value in values:
+            value = float(value)
+            while self.mins and self.mins[-1][1] >= value:
+                self.mins.pop()
+            self.mins.append((self.count, value))
+            while self.maxs and self.maxs[-1][1] <= value:
+                self.maxs.pop()
+            self.maxs.append((self.count, value))
+            self.count += 1
+
+        oldest = self.count - self.window
+        while self.mins and self.mins[0][0] < oldest:
+            self.mins.popleft()
+        while self.maxs and self.maxs[0][0] < oldest:
+            self.maxs.popleft()
+
+    def reset(self):
+        self.count = 0
+        self.mins.clear()
+        self.maxs.clear()
+
+    @property
+    def min(self):
+        return self.mins[0][1] if self.mins else None
+
+    @property
+    def max(self):
+        return self.maxs[0][1] if self.maxs else None
+
+
+class HysteresisRange:
+    """Set a ViewBox's y range only when the data meaningfully leaves it
+
+    The range is padded by `margin` of the data span. It grows as soon as
+    data falls outside it and shrinks only once the data uses less than
+    `shrink` of it, so the axes do not relayout on every frame.
+    """
+
+    def __init__(self, viewbox, margin=0.1, shrink=0.5):
+        self.viewbox = viewbox
+        self.margin = margin
+        self.shrink = shrink
+        self.range = None
+        viewbox.disableAutoRange(axis='y')
+
+    def update(self, lo, hi):
+        if lo is None or hi is None:
+            return False
+        # NumPy scalars (float32 in particular) overflow in ViewBox's limit checks
+        lo, hi = float(lo), float(hi)
+        if self.range is not None:
+            cur_lo, cur_hi = self.range
+            inside = cur_lo <= lo and hi <= cur_hi
+            if inside and (hi - lo) >= self.shrink * (cur_hi - cur_lo):
+                return False
+        span = hi - lo
+        pad = self.margin * span if span > 0 else max(abs(hi), 1.0) * self.margin
+        self.range = (lo - pad, hi + pad)
+        self.viewbox.setYRange(*self.range, padding=0)
+        return True
+
+    def update_many(self, bounds):
+        """Combine several (lo, hi) pairs, e.g. one per curve of a plot"""
+        bounds = [(lo, hi) for lo, hi in bounds if lo is not None]
+        if not bounds:
+            return False
+        return self.update(min(b[0] for b in bounds), max(b[1] for b in bounds))
@@ -0,0 +1,187 @@
+import argparse
+import csv
+import itertools
+import logging
+import os
+from multiprocessing import Pool
+import numpy as np
+from presets import PRESET_CONFIGS, sampling_rate
+from session import preset_file, session_presets, timestamp_channel
+
+# Sensor rows each feature reads, taken from the shared sensor layout
+ACCEL = PRESET_CONFIGS['DEFAULT']['Accelerometer']['channels']
+PPG_IR = PRESET_CONFIGS['AUXILIARY']['PPG_IR']['channels'][0]
+EDA, TEMP = PRESET_CONFIGS['ANCILLARY']['Biometrics']['channels']
+
+FIELDS = ['session', 'preset', 'window_start', 'feature', 'value']
+
+
+def windowed(x, n):
+    """(windows, n) view of a 1-D or (rows, samples) array, dropping the incomplete tail"""
+    count = x.shape[-1] // n
+    return x[..., :count * n].reshape(x.shape[:-1] + (count, n))
+
+
+def heart_rate(ppg, rate):
+    """Beats per minute per window from the dominant 0.7-3.5 Hz PPG frequency"""
+    ppg = ppg - ppg.mean(axis=-1, keepdims=True)
+    spectrum = np.abs(np.fft.rfft(ppg * np.hanning(ppg.shape[-1]), axis=-1))
+    freqs = np.fft.rfftfreq(ppg.shape[-1], 1.0 / rate)
+    band = (freqs >= 0.7) & (freqs <= 3.5)
+    return 60.0 * freqs[band][np.argmax(spectrum[:, band], axis=-1)]
+
+
+def scr_count(eda, rate, threshold=0.05, smooth_seconds=1.0):
+    """Skin conductance responses per window: rises of at least `threshold` uS per second"""
+    k = max(int(smooth_seconds * rate), 1)
+    # Trailing moving average of every window at once
+    total = np.cumsum(eda, axis=-1)
+    smoothed = (total[:, k:] - total[:, :-k]) / k
+    slope = np.diff(smoothed, axis=-1) * rate
+    rising = slope > threshold
+    onsets = rising[:, 1:] & ~rising[:, :-1]
+    return onsets.sum(axis=-1)
+
+
+def activity_counts(accel, threshold=0.05):
+    """Sum of |acceleration magnitude - 1 g| above a noise threshold, per window"""
+    magnitude = np.sqrt((accel ** 2).sum(axis=0))
+    excess = np.abs(magnitude - 1.0)
+    return np.where(excess > threshold, excess, 0.0).sum(axis=-1)
+
+
+def trend(values, rate):
+    """Least-squares slope per window, in units per minute"""
+    t = np.arange(values.shape[-1]) / rate
+    t = t - t.mean()
+    centered = values - values.mean(axis=-1, keepdims=True)
+    return 60.0 * (centered * t).sum(axis=-1) / (t ** 2).sum()
+
+
+def preset_features(preset_name, data, window_samples, rate):
+    """{feature: per-window values} for one block of a preset"""
+    if preset_name == 'DEFAULT':
+        return {'activity_counts': activity_counts(windowed(data[ACCEL], window_samples))}
+    if preset_name == 'AUXILIARY':
+        return {'heart_rate': heart_rate(windowed(data[PPG_IR], window_samples), rate)}
+    if preset_name == 'ANCILLARY':
+        return {
+            'scr_count': scr_count(windowed(data[EDA], window_samples), rate),
+            'eda_mean': windowed(data[EDA], window_samples).mean(axis=-1),
+            'temp_trend': trend(windowed(data[TEMP], window_samples), rate)
+        }
+    return {}
+
+
+def row_offsets(path, step):
+    """Byte offset of every `step`-th row of a file, and its row count, in one scan"""
+    offsets = []
+    offset = 0
+    rows = 0
+    with open(path, 'rb') as f:
+        for rows, line in enumerate(f, 1):
+            if (rows - 1) % step == 0:
+                offsets.append(offset)
+            offset += len(line)
+    return offsets, rows
+
+
+def task_id(task):
+    session_dir, preset_name, start, stop, window_samples, _ = task
+    return f'{os.path.basename(session_dir)}|{preset_name}|{start}-{stop}|{window_samples}'
+
+
+def plan_tasks(root, window, windows_per_task):
+    """Split every preset file of every session into whole-window row ranges
+
+    Each task carries the byte offset of its first row, so a worker seeks
+    straight to its range instead of reading the file up to it.
+    """
+    tasks = []
+    for name in sorted(os.listdir(root)):
+        session_dir = os.path.join(root, name)
+        if not os.path.isdir(session_dir):
+            continue
+        for preset_name in session_presets(session_dir):
+            window_samples = int(round(window * sampling_rate(preset_name)))
+            step = window_samples * windows_per_task
+            offsets, rows = row_offsets(preset_file(session_dir, preset_name), step)
+            for start, offset in zip(range(0, rows - window_samples + 1, step), offsets):
+                tasks.append((session_dir, preset_name, start, min(start + step, rows), window_samples, offset))
+    return tasks
+
+
+def run_task(task):
+    session_dir, preset_name, start, stop, window_samples, offset = task
+    with open(preset_file(session_dir, preset_name), 'rb') as f:
+        f.seek(offset)
+        lines = [line.decode() for line in itertools.islice(f, stop - start)]
+    data = np.loadtxt(lines, delimiter='\t', ndmin=2).T
+    starts = windowed(data[timestamp_channel(preset_name)], window_samples)[:, 0]
+    features = preset_features(preset_name, data, window_samples, sampling_rate(preset_name))
+    session = os.path.basename(session_dir)
+    rows = [
+        (session, preset_name, f'{t:.6f}', feature, f'{v:.6g}')
+        for feature, values in features.items()
+        for t, v in zip(starts, values)
+    ]
+    return task_id(task), rows
+
+
+def run_batch(root, out_path, window=60.0, windows_per_task=30, workers=None):
+    """Compute features for every session under root, appending to out_path
+
+    Finished tasks are listed in <out_path>.done after their rows are
+    written, together with the size of out_path at that point, so an
+    interrupted run picks up where it stopped: rows written by a task that
+    never made it into the list are cut off before resuming.
+    """
+    done_path = out_path + '.done'
+    done = set()
+    committed = 0
+    if os.path.exists(done_path):
+        with open(done_path) as f:
+            for line in f:
+                fields = line.rstrip('\n').split('\t')
+                # A line cut short by the interruption has no size yet
+                if len(fields) == 2 and fields[1].isdigit():
+                    done.add(fields[0])
+                    committed = max(committed, int(fields[1]))
+    if os.path.exists(out_path):
+        with open(out_path, 'r+b') as f:
+            f.truncate(committed)
+
+    tasks = [t for t in plan_tasks(root, window, windows_per_task) if task_id(t) not in done]
+    logging.info(f'{len(tasks)} tasks to run, {len(done)} already done')
+
+    new_file = not committed
+    with open(out_path, 'a', newline='') as out, open(done_path, 'a') as done_file, Pool(workers) as pool:
+        writer = csv.writer(out)
+        if new_file:
+            writer.writerow(FIELDS)
+        for count, (tid, rows) in enumerate(pool.imap_unordered(run_task, tasks), 1):
+            writer.writerows(rows)
+            out.flush()
+            done_file.write(f'{tid}\t{out.tell()}\n')
+            done_file.flush()
+            if count % 10 == 0 or count == len(tasks):
+                logging.info(f'{count}/{len(tasks)} tasks')
+    return len(tasks)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description='Windowed features for a directory of recorded sessions')
+    parser.add_argument('sessions', help='directory containing one sub-directory per session')
+    parser.add_argument('--out', default='features.csv')
+    parser.add_argument('--window', type=float, default=60.0, help='window length in seconds')
+    parser.add_argument('--windows-per-task', type=int, default=30)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    run_batch(args.sessions, args.out, args.window, args.windows_per_task, args.workers)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+import numpy as np
+
+
+class ChannelSubset:
+    """Compact float32 copy of just the board rows a sensor config uses
+
+    BrainFlow hands back a float64 array holding every row of the preset,
+    while the viewers only draw a handful of them. The used rows are packed
+    into one preallocated, C-contiguous float32 buffer, ordered sensor by
+    sensor so that each sensor's channels form a contiguous block.
+    """
+
+    def __init__(self, sensors, capacity, dtype=np.float32):
+        self.rows = []
+        self.slices = {}
+        for sensor_name, sensor_info in sensors.items():
+            start = len(self.rows)
+            self.rows.extend(sensor_info['channels'])
+            self.slices[sensor_name] = slice(start, len(self.rows))
+        self.buffer = np.zeros((len(self.rows), capacity), dtype=dtype)
+        self.offsets = np.zeros(len(self.rows), dtype=dtype)
+        self.length = 0
+
+    @property
+    def data(self):
+        return self.buffer[:, :self.length]
+
+    def compact(self, data):
+        """Copy the configured rows of a board array, converting to float32 on the fly"""
+        n = min(data.shape[1], self.buffer.shape[1])
+        self.length = 0
+        if n == 0:
+            return self.data
+        for i, channel in enumerate(self.rows):
+            if channel < data.shape[0]:
+                self.buffer[i, :n] = data[channel, -n:]
+            else:
+                self.buffer[i, :n] = 0
+        self.length = n
+        return self.data
+
+    def sensor(self, sensor_name):
+        """(channels, samples) block for one sensor, a view into the buffer"""
+        return self.buffer[self.slices[sensor_name], :self.length]
+
+    def process(self, plan, active=None):
+        """Run each sensor's compiled pipeline over its block, in place
+
+        Means removed by detrend are kept in `offsets`, one per row, so
+        values tracked on the raw samples can be mapped onto the output.
+        active optionally masks rows whose features are worth computing
+        (QualityMonitor.active).
+        """
+        for sensor_name, rows in self.slices.items():
+            plan.run(sensor_name, self.buffer[rows, :self.length], self.offsets[rows],
+                     None if active is None else active[rows])
+
+
+class ChannelRing:
+    """Sliding window of the configured rows, refilled in place from drained board data
+
+    Every sample is written twice, at i and i + capacity, so the window is
+    always the contiguous slice [pos + capacity - length, pos + capacity)
+    and never needs rolling. The processed copy handed to the plots lives
+    in a second preallocated buffer, so with a detrend-only pipeline a
+    frame allocates nothing beyond the array BrainFlow returns for the
+    newly drained samples.
+    """
+
+    def __init__(self, sensors, capacity, dtype=np.float32):
+        self.rows = []
+        self.slices = {}
+        for sensor_name, sensor_info in sensors.items():
+            start = len(self.rows)
+            self.rows.extend(sensor_info['channels'])
+            self.slices[sensor_name] = slice(start, len(self.rows))
+        self.capacity = capacity
+        self.store = np.zeros((len(self.rows), 2 * capacity), dtype=dtype)
+        self.out = np.zeros((len(self.rows), capacity), dtype=dtype)
+        self.offsets = np.zeros(len(self.rows), dtype=dtype)
+        self.pos = 0
+        self.length = 0
+
+    @property
+    def data(self):
+        """Raw window, oldest sample first, a view into the store"""
+        end = self.pos + self.capacity
+        return self.store[:, end - self.length:end]
+
+    def drain(self, board_shim, preset=0):
+        """Append whatever the board buffered since the last call, return the sample count"""
+        data = board_shim.get_board_data(preset=preset)
+        self.append(data)
+        return data.shape[1]
+
+    def append(self, data):
+        n = min(data.shape[1], self.capacity)
+        if n == 0:
+            return
+        start = data.shape[1] - n
+        # At most two contiguous pieces around the wrap point, each written twice
+        first = min(n, self.capacity - self.pos)
+        for i, channel in enumerate(self.rows):
+            if channel >= data.shape[0]:
+                continue
+            row = self.store[i]
+            src = data[channel]
+            row[self.pos:self.pos + first] = src[start:start + first]
+            row[self.pos + self.capacity:self.pos + self.capacity + first] = src[start:start + first]
+            if n > first:
+                row[:n - first] = src[start + first:start + n]
+                row[self.capacity:self.capacity + n - first] = src[start + first:start + n]
+        self.pos = (self.pos + n) % self.capacity
+        self.length = min(self.capacity, self.length + n)
+
+    def sensor(self, sensor_name):
+        """(channels, samples) block of the processed output for one sensor"""
+        return self.out[self.slices[sensor_name], :self.length]
+
+    def process(self, plan, active=None):
+        """Fill the output buffer with the window run through each sensor's pipeline"""
+        window = self.data
+        for sensor_name, rows in self.slices.items():
+            out = self.out[rows, :self.length]
+            np.copyto(out, window[rows])
+            plan.run(sensor_name, out, self.offsets[rows], None if active is None else active[rows])
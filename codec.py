@@ -0,0 +1,221 @@
+import argparse
+import itertools
+import json
+import os
+import struct
+import time
+import zlib
+import numpy as np
+from brainflow.board_shim import BoardShim
+from presets import BOARD_ID, PRESET_MAP
+from session import preset_file, session_presets
+
+# A compressed preset file (<PRESET>.ebz) is a sequence of independent blocks:
+#   uint32 header length | uint32 payload length | JSON header | zlib payload
+# The header lists, per board row, how it was coded and where its bytes are.
+# Rows are turned into integers (exactly, when their values are decimals of
+# a fixed number of places, or by rounding to a quantum of 2 x max_error),
+# delta encoded, narrowed to the smallest integer type that holds the
+# deltas and byte-shuffled before zlib. Rows that cannot be turned into
+# integers (NaN, arbitrary floats) keep their raw float64 bytes.
+EXTENSION = '.ebz'
+MAX_DECIMALS = 9
+INT_TYPES = (np.int8, np.int16, np.int32, np.int64)
+
+
+def compressed_file(path, preset_name):
+    return os.path.join(path, f'{preset_name}{EXTENSION}')
+
+
+def exact_rows(preset_name):
+    """Rows that are always stored losslessly: timestamp, marker and package number"""
+    preset = PRESET_MAP[preset_name]
+    return {
+        BoardShim.get_timestamp_channel(BOARD_ID, preset),
+        BoardShim.get_marker_channel(BOARD_ID, preset),
+        BoardShim.get_package_num_channel(BOARD_ID, preset)
+    }
+
+
+def decimals(x, max_decimals=MAX_DECIMALS):
+    """Fewest decimal places that reproduce every value exactly, or None"""
+    for d in range(max_decimals + 1):
+        scale = 10.0 ** d
+        k = np.round(x * scale)
+        if np.all(np.abs(k) < 2 ** 53) and np.array_equal(k / scale, x):
+            return d
+    return None
+
+
+def _shuffle(values):
+    """Group the bytes by significance, which deflate handles much better for small deltas"""
+    return values.view(np.uint8).reshape(-1, values.itemsize).T.tobytes()
+
+
+def _unshuffle(raw, dtype, n):
+    itemsize = np.dtype(dtype).itemsize
+    return np.frombuffer(raw, np.uint8).reshape(itemsize, n).T.copy().view(dtype).ravel()
+
+
+def encode_row(x, max_error=None):
+    """(header, bytes) for one row; max_error None means lossless"""
+    if len(x) and np.all(np.isfinite(x)):
+        # Values already on a grid coarser than the allowed error stay exact
+        limit = MAX_DECIMALS if not max_error else int(np.floor(-np.log10(2.0 * max_error)))
+        d = decimals(x, limit) if limit >= 0 else None
+        if d is not None:
+            k = np.round(x * 10.0 ** d)
+            header = {'mode': 'decimal', 'decimals': d}
+        elif max_error:
+            quantum = 2.0 * max_error
+            k = np.round(x / quantum)
+            header = {'mode': 'quantum', 'quantum': quantum}
+        else:
+            k = None
+        if k is not None and np.all(np.abs(k) < 2 ** 62):
+            k = k.astype(np.int64)
+            delta = np.diff(k)
+            lo, hi = (int(delta.min()), int(delta.max())) if len(delta) else (0, 0)
+            dtype = next(t for t in INT_TYPES if np.iinfo(t).min <= lo and hi <= np.iinfo(t).max)
+            header.update({'first': int(k[0]), 'dtype': np.dtype(dtype).name})
+            return header, _shuffle(delta.astype(dtype))
+    return {'mode': 'raw'}, _shuffle(np.ascontiguousarray(x, dtype=np.float64))
+
+
+def decode_row(header, raw, n):
+    if header['mode'] == 'raw':
+        return _unshuffle(raw, np.float64, n)
+    k = np.empty(n, dtype=np.int64)
+    k[0] = header['first']
+    np.cumsum(_unshuffle(raw, header['dtype'], n - 1), out=k[1:])
+    k[1:] += header['first']
+    if header['mode'] == 'quantum':
+        return k * header['quantum']
+    return k / 10.0 ** header['decimals']
+
+
+def encode_block(data, max_error=None, exact=(), level=6):
+    """Compress a (rows, samples) board array into one block's bytes
+
+    max_error is the largest absolute error allowed per value, as a number
+    for every row or a {row: error} dict; rows in `exact` and rows without
+    an error stay lossless.
+    """
+    rows = []
+    parts = []
+    for i, x in enumerate(data):
+        error = max_error.get(i) if isinstance(max_error, dict) else max_error
+        header, raw = encode_row(x, None if i in exact else error)
+        header['size'] = len(raw)
+        rows.append(header)
+        parts.append(raw)
+    payload = zlib.compress(b''.join(parts), level)
+    header = json.dumps({'samples': data.shape[1], 'rows': rows}).encode()
+    return struct.pack('<II', len(header), len(payload)) + header + payload
+
+
+def decode_block(f):
+    """Read one block from a file object, None at the end of the file"""
+    prefix = f.read(8)
+    if len(prefix) < 8:
+        return None
+    header_size, payload_size = struct.unpack('<II', prefix)
+    header = json.loads(f.read(header_size))
+    raw = zlib.decompress(f.read(payload_size))
+    n = header['samples']
+    data = np.empty((len(header['rows']), n))
+    offset = 0
+    for i, row in enumerate(header['rows']):
+        data[i] = decode_row(row, raw[offset:offset + row['size']], n)
+        offset += row['size']
+    return data
+
+
+class CodecWriter:
+    """Append board arrays of one preset to a .ebz file, one block every block_rows samples"""
+
+    def __init__(self, path, preset_name, max_error=None, block_rows=15000, mode='wb'):
+        self.file = open(path, mode)
+        self.max_error = max_error
+        self.exact = exact_rows(preset_name)
+        self.block_rows = block_rows
+        self.pending = []
+        self.pending_rows = 0
+
+    def append(self, data):
+        if data.shape[1] == 0:
+            return
+        self.pending.append(data)
+        self.pending_rows += data.shape[1]
+        if self.pending_rows >= self.block_rows:
+            self.flush()
+
+    def flush(self):
+        if self.pending_rows:
+            self.file.write(encode_block(np.hstack(self.pending), self.max_error, self.exact))
+        self.pending = []
+        self.pending_rows = 0
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+def read_compressed(path):
+    """Decode a whole .ebz file into one (rows, samples) array"""
+    blocks = []
+    with open(path, 'rb') as f:
+        while True:
+            block = decode_block(f)
+            if block is None:
+                break
+            blocks.append(block)
+    return np.hstack(blocks) if blocks else np.empty((0, 0))
+
+
+def compress_session(path, out_path=None, max_error=None, block_rows=15000):
+    """Write <PRESET>.ebz for every recorded preset, returning {preset: (csv bytes, ebz bytes)}"""
+    out_path = out_path or path
+    os.makedirs(out_path, exist_ok=True)
+    sizes = {}
+    for preset_name in session_presets(path):
+        source = preset_file(path, preset_name)
+        target = compressed_file(out_path, preset_name)
+        writer = CodecWriter(target, preset_name, max_error, block_rows)
+        with open(source) as f:
+            while True:
+                lines = list(itertools.islice(f, block_rows))
+                if not lines:
+                    break
+                writer.append(np.loadtxt(lines, delimiter='\t', ndmin=2).T)
+        writer.close()
+        sizes[preset_name] = (os.path.getsize(source), os.path.getsize(target))
+    return sizes
+
+
+def load_compressed_session(path, presets=None):
+    """Like session.load_session, for a session compressed with compress_session"""
+    names = presets if presets is not None else [
+        name for name in PRESET_MAP if os.path.isfile(compressed_file(path, name))]
+    return {name: read_compressed(compressed_file(path, name)) for name in names}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compress a recorded session with the delta/quantization codec')
+    parser.add_argument('session')
+    parser.add_argument('--out', help='directory for the .ebz files, defaults to the session directory')
+    parser.add_argument('--max-error', type=float, default=None,
+                        help='largest absolute error per sensor value; lossless when omitted')
+    parser.add_argument('--block-rows', type=int, default=15000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    sizes = compress_session(args.session, args.out, args.max_error, args.block_rows)
+    elapsed = time.perf_counter() - start
+    for preset_name, (raw, packed) in sizes.items():
+        print(f"{preset_name}: {raw} -> {packed} bytes ({raw / max(packed, 1):.1f}x)")
+    print(f"Took {elapsed:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+import argparse
+import datetime
+import itertools
+import json
+import os
+import numpy as np
+from brainflow.board_shim import BoardShim
+from presets import BOARD_ID, PRESET_CONFIGS, PRESET_MAP
+from resample import resample_session
+from session import load_session, preset_file, session_presets
+
+# An export holds one directory per preset:
+#   <out>/<PRESET>/manifest.json       - column names and, per chunk, row count and timestamp min/max
+#   <out>/<PRESET>/chunk_000000.npz    - one compressed array per column
+# The per-chunk min/max list is the sparse time index: a range query opens only
+# the chunks it overlaps, and only the requested columns inside them.
+MANIFEST = 'manifest.json'
+TIMESTAMP = 'timestamp'
+
+
+def column_names(preset_name):
+    """Name of every board row of a preset, e.g. Accelerometer_X or PPG_IR"""
+    preset = PRESET_MAP[preset_name]
+    names = [f'ch{i}' for i in range(BoardShim.get_num_rows(BOARD_ID, preset))]
+    for sensor_name, sensor_info in PRESET_CONFIGS[preset_name].items():
+        for channel, name in zip(sensor_info['channels'], sensor_info['names']):
+            names[channel] = f'{sensor_name}_{name}'
+    names[BoardShim.get_timestamp_channel(BOARD_ID, preset)] = TIMESTAMP
+    names[BoardShim.get_marker_channel(BOARD_ID, preset)] = 'marker'
+    names[BoardShim.get_package_num_channel(BOARD_ID, preset)] = 'package_num'
+    return names
+
+
+class ColumnarWriter:
+    """Append board arrays of one preset, flushing a compressed chunk every chunk_rows rows"""
+
+    def __init__(self, out_dir, preset_name, chunk_rows=60000):
+        self.dir = os.path.join(out_dir, preset_name)
+        os.makedirs(self.dir, exist_ok=True)
+        self.preset_name = preset_name
+        self.columns = column_names(preset_name)
+        self.chunk_rows = chunk_rows
+        self.pending = []
+        self.pending_rows = 0
+        self.manifest = {'preset': preset_name, 'columns': self.columns, 'chunks': []}
+
+    def append(self, data):
+        if data.shape[1] == 0:
+            return
+        self.pending.append(data)
+        self.pending_rows += data.shape[1]
+        while self.pending_rows >= self.chunk_rows:
+            block = np.hstack(self.pending)
+            self._write_chunk(block[:, :self.chunk_rows])
+            rest = block[:, self.chunk_rows:]
+            self.pending = [rest] if rest.shape[1] else []
+            self.pending_rows = rest.shape[1]
+
+    def close(self):
+        if self.pending_rows:
+            self._write_chunk(np.hstack(self.pending))
+        self.pending = []
+        self.pending_rows = 0
+        with open(os.path.join(self.dir, MANIFEST), 'w') as f:
+            json.dump(self.manifest, f, indent=2)
+
+    def _write_chunk(self, block):
+        name = f"chunk_{len(self.manifest['chunks']):06d}.npz"
+        np.savez_compressed(os.path.join(self.dir, name), **dict(zip(self.columns, block)))
+        timestamps = block[self.columns.index(TIMESTAMP)]
+        self.manifest['chunks'].append({
+            'file': name,
+            'rows': int(block.shape[1]),
+            't_min': float(timestamps.min()),
+            't_max': float(timestamps.max())
+        })
+
+
+def export_session(session_path, out_dir, chunk_rows=60000, presets=None, resample=False, rate=None):
+    """Convert a recorded session directory, streaming each file through in chunk_rows pieces
+
+    With resample set, every preset is first put on one shared timebase
+    (resample.resample_session, at `rate` or the fastest preset's rate) so
+    rows line up across presets; that needs the whole session in memory.
+    """
+    if resample:
+        _, preset_data = resample_session(load_session(session_path, presets), rate)
+        for preset_name, data in preset_data.items():
+            writer = ColumnarWriter(out_dir, preset_name, chunk_rows)
+            writer.append(data)
+            writer.close()
+        return
+    for preset_name in presets or session_presets(session_path):
+        writer = ColumnarWriter(out_dir, preset_name, chunk_rows)
+        with open(preset_file(session_path, preset_name)) as f:
+            while True:
+                lines = list(itertools.islice(f, chunk_rows))
+                if not lines:
+                    break
+                writer.append(np.loadtxt(lines, delimiter='\t', ndmin=2).T)
+        writer.close()
+
+
+def load_manifest(out_dir, preset_name):
+    with open(os.path.join(out_dir, preset_name, MANIFEST)) as f:
+        return json.load(f)
+
+
+def query(out_dir, preset_name, t0=None, t1=None, columns=None):
+    """{column: values} for rows with timestamps in [t0, t1], reading only overlapping chunks"""
+    manifest = load_manifest(out_dir, preset_name)
+    columns = list(columns) if columns is not None else manifest['columns']
+    wanted = columns if TIMESTAMP in columns else columns + [TIMESTAMP]
+    lo = -np.inf if t0 is None else t0
+    hi = np.inf if t1 is None else t1
+
+    # Chunks are written in time order, so both bounds are binary searches
+    chunks = manifest['chunks']
+    t_max = np.array([c['t_max'] for c in chunks])
+    t_min = np.array([c['t_min'] for c in chunks])
+    first = np.searchsorted(t_max, lo, side='left')
+    last = np.searchsorted(t_min, hi, side='right')
+
+    parts = {name: [] for name in wanted}
+    for chunk in chunks[first:last]:
+        with np.load(os.path.join(out_dir, preset_name, chunk['file'])) as npz:
+            timestamps = npz[TIMESTAMP]
+            mask = (timestamps >= lo) & (timestamps <= hi)
+            for name in wanted:
+                parts[name].append(timestamps[mask] if name == TIMESTAMP else npz[name][mask])
+    return {name: np.concatenate(parts[name]) if parts[name] else np.empty(0) for name in columns}
+
+
+def parse_clock(text, reference):
+    """Turn 'HH:MM[:SS]' into a unix timestamp on the local date of `reference`"""
+    day = datetime.datetime.fromtimestamp(reference).date()
+    clock = datetime.time.fromisoformat(text)
+    return datetime.datetime.combine(day, clock).timestamp()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export a recorded session to chunked columnar files, or query an export')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    export = sub.add_parser('export')
+    export.add_argument('session')
+    export.add_argument('out')
+    export.add_argument('--chunk-rows', type=int, default=60000)
+    export.add_argument('--resample', action='store_true', help='put all presets on one shared timebase')
+    export.add_argument('--rate', type=float, default=None, help='resampling rate in Hz, defaults to the fastest preset')
+
+    q = sub.add_parser('query')
+    q.add_argument('out')
+    q.add_argument('--preset', default='ANCILLARY', choices=list(PRESET_MAP))
+    q.add_argument('--start', help='HH:MM[:SS] local time')
+    q.add_argument('--end', help='HH:MM[:SS] local time')
+    q.add_argument('--columns', nargs='*', help='e.g. Biometrics_EDA')
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        export_session(args.session, args.out, args.chunk_rows, resample=args.resample, rate=args.rate)
+        return
+
+    manifest = load_manifest(args.out, args.preset)
+    reference = manifest['chunks'][0]['t_min'] if manifest['chunks'] else 0
+    t0 = parse_clock(args.start, reference) if args.start else None
+    t1 = parse_clock(args.end, reference) if args.end else None
+    result = query(args.out, args.preset, t0, t1, args.columns)
+    for name, values in result.items():
+        print(f"{name}: {len(values)} rows")
+        if len(values):
+            print(f"  Mean: {np.mean(values):.4f}")
+            print(f"  Range: [{np.min(values):.4f}, {np.max(values):.4f}]")
+
+
+if __name__ == '__main__':
+    main()
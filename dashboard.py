@@ -0,0 +1,282 @@
+import argparse
+import ipaddress
+import logging
+import numpy as np
+import pyqtgraph as pg
+from brainflow.board_shim import BoardShim
+from brainflow.exit_codes import BrainFlowError
+from PyQt5.QtCore import QPoint, QRect
+from PyQt5.QtWidgets import (QApplication, QComboBox, QFrame, QGridLayout, QHBoxLayout, QLabel,
+                             QScrollArea, QVBoxLayout, QWidget)
+from axis_range import HysteresisRange
+from buffers import ChannelRing
+from pacing import FramePacer
+from pipeline import Plan
+from presets import PRESET_CONFIGS, PRESET_MAP, sampling_rate, window_points
+from quality import QualityMonitor
+from rules import RuleEngine, log_trigger, osc_trigger
+from session_manager import SessionManager, emotibit_params
+
+ALL = 'All'
+
+
+class Panel(QFrame):
+    """Slot in the dashboard grid for one device's sensor
+
+    The slot always has its final size, so the scroll area lays out the
+    whole wall, but it only holds a PlotWidget while it is on screen.
+    """
+
+    def __init__(self, device, preset_name, sensor_name, height):
+        super().__init__()
+        self.device = device
+        self.preset_name = preset_name
+        self.sensor_name = sensor_name
+        self.key = (device, preset_name)
+        self.setFixedHeight(height)
+        self.setMinimumWidth(240)
+        self.layout = QVBoxLayout(self)
+        self.layout.setContentsMargins(0, 0, 0, 0)
+        self.plot = None
+        self.curves = []
+        self.range = None
+        self.title = None
+
+    def activate(self, plot):
+        sensor_info = PRESET_CONFIGS[self.preset_name][self.sensor_name]
+        self.plot = plot
+        plot.clear()
+        self.title = None
+        self.curves = [
+            plot.plot(pen=pg.mkPen(color=color, width=1), name=name, skipFiniteCheck=True)
+            for name, color in zip(sensor_info['names'], sensor_info['colors'])
+        ]
+        self.range = HysteresisRange(plot.getViewBox())
+        self.layout.addWidget(plot)
+        plot.show()
+
+    def deactivate(self):
+        """Give the PlotWidget back, keeping nothing but the empty slot"""
+        plot = self.plot
+        self.layout.removeWidget(plot)
+        plot.hide()
+        plot.setParent(None)
+        self.plot = None
+        self.curves = []
+        self.range = None
+        return plot
+
+    def set_badges(self, badges):
+        title = f'{self.device} {self.sensor_name}&nbsp;&nbsp;{badges}'
+        if title != self.title:
+            self.title = title
+            self.plot.setTitle(title, size='8pt')
+
+    def draw(self, time_axis, block):
+        for curve, channel_data in zip(self.curves, block):
+            curve.setData(time_axis, channel_data)
+        if block.shape[1]:
+            self.range.update(float(block.min()), float(block.max()))
+
+
+class Dashboard:
+    """Wall of device x sensor plots that only renders what is on screen
+
+    Every device's preset buffers are drained on every tick, so they stay
+    current (along with their alert rules and signal quality), but plots exist only for panels inside the scroll viewport
+    (plus a one-panel margin) that pass the device and sensor filters.
+    PlotWidgets leaving the viewport go back to a pool for reuse, so the
+    render cost follows the number of visible panels, not the wall size.
+    """
+
+    def __init__(self, boards, window_size=8, display_hz=30, panel_height=160, triggers=(log_trigger,),
+                 on_data=None):
+        self.boards = boards
+        # Draining empties BrainFlow's buffer, so whoever watches stream
+        # liveness (SessionManager.saw_data) is told about every chunk
+        self.on_data = on_data
+        self.window_size = window_size
+        self.panel_height = panel_height
+        self.rings = {
+            (device, preset_name): ChannelRing(sensors, window_points(preset_name, window_size))
+            for device in boards
+            for preset_name, sensors in PRESET_CONFIGS.items()
+        }
+        self.time_axes = {
+            preset_name: (np.arange(n) - (n - 1)) / sampling_rate(preset_name)
+            for preset_name, n in ((p, window_points(p, window_size)) for p in PRESET_CONFIGS)
+        }
+        self.quality = {
+            (device, preset_name): QualityMonitor(sensors, sampling_rate(preset_name))
+            for device in boards
+            for preset_name, sensors in PRESET_CONFIGS.items()
+        }
+        self.plans = {
+            preset_name: Plan(sensors, sampling_rate(preset_name))
+            for preset_name, sensors in PRESET_CONFIGS.items()
+        }
+        self.dirty = set()
+        # Alerts are evaluated on each drained chunk, visible or not
+        self.rules = RuleEngine(triggers=list(triggers) + [self._show_alert])
+        self.last_alert = ''
+        self.pool = []
+        self.active = set()
+
+        pg.setConfigOptions(antialias=False)
+        self.app = QApplication([])
+        self.main_window = QWidget()
+        self.main_window.setWindowTitle('EmotiBit Dashboard')
+        layout = QVBoxLayout(self.main_window)
+
+        # Focus controls: restrict the wall to one device and/or one sensor
+        controls = QHBoxLayout()
+        self.device_filter = QComboBox()
+        self.device_filter.addItems([ALL] + list(boards))
+        self.sensor_filter = QComboBox()
+        self.sensor_filter.addItems([ALL] + [s for sensors in PRESET_CONFIGS.values() for s in sensors])
+        self.device_filter.currentTextChanged.connect(self.apply_filters)
+        self.sensor_filter.currentTextChanged.connect(self.apply_filters)
+        self.status = QLabel()
+        controls.addWidget(QLabel('Device'))
+        controls.addWidget(self.device_filter)
+        controls.addWidget(QLabel('Sensor'))
+        controls.addWidget(self.sensor_filter)
+        controls.addStretch()
+        controls.addWidget(self.status)
+        layout.addLayout(controls)
+
+        self.scroll = QScrollArea()
+        self.scroll.setWidgetResizable(True)
+        wall = QWidget()
+        self.grid = QGridLayout(wall)
+        self.panels = []
+        for row, device in enumerate(boards):
+            column = 0
+            for preset_name, sensors in PRESET_CONFIGS.items():
+                for sensor_name in sensors:
+                    panel = Panel(device, preset_name, sensor_name, panel_height)
+                    self.grid.addWidget(panel, row, column)
+                    self.panels.append(panel)
+                    column += 1
+        self.scroll.setWidget(wall)
+        self.scroll.verticalScrollBar().valueChanged.connect(self.update_visibility)
+        self.scroll.horizontalScrollBar().valueChanged.connect(self.update_visibility)
+        layout.addWidget(self.scroll)
+        self.main_window.resize(1600, 1000)
+
+        rate = max(sampling_rate(p) for p in PRESET_CONFIGS)
+        self.timer = FramePacer(self.render, self.poll, display_hz, rate, on_rate=self._show_rate)
+        self.timer.start()
+
+        self.main_window.show()
+        self.update_visibility()
+        self.app.exec_()
+
+    def apply_filters(self):
+        device = self.device_filter.currentText()
+        sensor = self.sensor_filter.currentText()
+        for panel in self.panels:
+            panel.setVisible(device in (ALL, panel.device) and sensor in (ALL, panel.sensor_name))
+        self.update_visibility()
+
+    def _on_screen(self, panel):
+        if not panel.isVisible():
+            return False
+        viewport = self.scroll.viewport()
+        area = viewport.rect().adjusted(0, -self.panel_height, 0, self.panel_height)
+        return area.intersects(QRect(panel.mapTo(viewport, QPoint(0, 0)), panel.size()))
+
+    def update_visibility(self):
+        """Create plots for panels that came on screen and suspend the ones that left"""
+        for panel in self.panels:
+            visible = self._on_screen(panel)
+            if visible and panel.plot is None:
+                panel.activate(self.pool.pop() if self.pool else pg.PlotWidget(background='w'))
+                self.active.add(panel)
+                self._draw(panel)
+            elif not visible and panel.plot is not None:
+                self.pool.append(panel.deactivate())
+                self.active.discard(panel)
+
+    def poll(self):
+        """Drain every board into its buffers and the rules, True if a visible panel has new data"""
+        for (device, preset_name), ring in self.rings.items():
+            try:
+                data = self.boards[device].get_board_data(preset=PRESET_MAP[preset_name])
+            except BrainFlowError:
+                # Reconnecting; the session manager brings the stream back
+                continue
+            if data.shape[1] > 0:
+                if self.on_data is not None:
+                    self.on_data(device)
+                ring.append(data)
+                self.quality[(device, preset_name)].push(data)
+                self.rules.process(device, preset_name, data)
+                self.dirty.add((device, preset_name))
+        return any(panel.key in self.dirty for panel in self.active)
+
+    def render(self):
+        self.update_visibility()
+        processed = set()
+        for panel in self.active:
+            if panel.key not in self.dirty:
+                continue
+            if panel.key not in processed:
+                self.rings[panel.key].process(self.plans[panel.preset_name], self.quality[panel.key].active)
+                processed.add(panel.key)
+            self._draw(panel, processed=True)
+        self.dirty.clear()
+
+    def _draw(self, panel, processed=False):
+        ring = self.rings[panel.key]
+        if ring.length == 0:
+            return
+        quality = self.quality[panel.key]
+        if not processed:
+            ring.process(self.plans[panel.preset_name], quality.active)
+        panel.set_badges(quality.badges(panel.sensor_name))
+        panel.draw(self.time_axes[panel.preset_name][-ring.length:], ring.sensor(panel.sensor_name))
+
+    def _show_alert(self, event):
+        self.last_alert = f"  last alert: {event['device']} {event['rule']}"
+
+    def _show_rate(self, rate):
+        self.status.setText(f'{len(self.active)}/{len(self.panels)} panels live, {rate:.0f} FPS{self.last_alert}')
+
+
+def main():
+    BoardShim.enable_dev_board_logger()
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description='Scrollable plot wall for many EmotiBits')
+    parser.add_argument('--devices', type=int, default=1)
+    parser.add_argument('--base-ip', default='192.168.229.255', help='address of the first device, the rest follow it')
+    parser.add_argument('--window', type=float, default=8.0, help='seconds shown per plot')
+    parser.add_argument('--osc', help='host:port to send alert rules to as OSC messages')
+    args = parser.parse_args()
+
+    triggers = [log_trigger]
+    if args.osc:
+        host, port = args.osc.rsplit(':', 1)
+        triggers.append(osc_trigger(host, int(port)))
+
+    base = ipaddress.ip_address(args.base_ip)
+    devices = {
+        f'emotibit-{i:02d}': emotibit_params(str(base + i), 3132, 15)
+        for i in range(args.devices)
+    }
+    manager = SessionManager(devices)
+    try:
+        boards = manager.start()
+        if not boards:
+            logging.error(f'Could not connect: {manager.stats()}')
+            return
+        Dashboard(boards, args.window, triggers=triggers, on_data=manager.saw_data)
+    except Exception as e:
+        logging.error(f'Error: {str(e)}', exc_info=True)
+    finally:
+        manager.stop()
+
+
+if __name__ == '__main__':
+    main()
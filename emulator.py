@@ -0,0 +1,209 @@
+import argparse
+import asyncio
+import ipaddress
+import logging
+import random
+import time
+import numpy as np
+from protocol import (ADVERTISING_PORT, CONTROL_PORT, DATA_PORT, EMOTIBIT_CONNECT, HELLO_EMOTIBIT, HELLO_HOST,
+                      PING, PONG, make_packet, parse_packet)
+
+# Type tags grouped by the BrainFlow preset they end up in
+STREAMS = {
+    'imu': ['AX', 'AY', 'AZ', 'GX', 'GY', 'GZ', 'MX', 'MY', 'MZ'],
+    'ppg': ['PI', 'PR', 'PG'],
+    'eda': ['EA', 'T1']
+}
+
+
+class SignalGenerator:
+    """Plausible synthetic samples for every type tag, generated a block at a time"""
+
+    def __init__(self, seed):
+        self.rng = np.random.default_rng(seed)
+        self.heart_rate = self.rng.uniform(55, 90) / 60.0
+        self.eda_level = self.rng.uniform(0.5, 5.0)
+
+    def block(self, stream, t):
+        n = len(t)
+        if stream == 'imu':
+            accel = np.array([[0.0], [0.0], [1.0]]) + 0.02 * self.rng.standard_normal((3, n))
+            gyro = 2.0 * np.sin(2 * np.pi * 0.3 * t) + self.rng.standard_normal((3, n))
+            mag = np.array([[20.0], [-5.0], [40.0]]) + 0.5 * self.rng.standard_normal((3, n))
+            return np.vstack([accel, gyro, mag])
+        if stream == 'ppg':
+            pulse = np.sin(2 * np.pi * self.heart_rate * t)
+            base = np.array([[60000.0], [45000.0], [8000.0]])
+            return base + np.array([[400.0], [300.0], [150.0]]) * pulse + 20 * self.rng.standard_normal((3, n))
+        eda = self.eda_level + 0.2 * np.sin(2 * np.pi * 0.02 * t) + 0.01 * self.rng.standard_normal(n)
+        temp = 33.0 + 0.05 * self.rng.standard_normal(n)
+        return np.vstack([eda, temp])
+
+
+class VirtualEmotibit(asyncio.DatagramProtocol):
+    """One emulated EmotiBit listening for BrainFlow on its own address"""
+
+    def __init__(self, host, adv_port, rates, loss=0.0, jitter_ms=0.0, samples_per_packet=2, seed=0):
+        self.host = host
+        self.adv_port = adv_port
+        self.rates = rates
+        self.loss = loss
+        self.jitter = jitter_ms / 1000.0
+        self.samples_per_packet = samples_per_packet
+        self.signals = SignalGenerator(seed)
+        self.random = random.Random(seed)
+
+        self.boot = time.monotonic()
+        self.packet_number = 0
+        self.transport = None
+        self.data_transport = None
+        self.data_addr = None
+        self.control_writer = None
+        self.stream_task = None
+        self.sent = 0
+        self.dropped = 0
+
+    def millis(self):
+        return int((time.monotonic() - self.boot) * 1000)
+
+    def next_packet(self, type_tag, payload=()):
+        packet = make_packet(self.millis(), self.packet_number, type_tag, payload)
+        self.packet_number = (self.packet_number + 1) % 65536
+        return packet
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self.transport, _ = await loop.create_datagram_endpoint(
+            lambda: self, local_addr=(self.host, self.adv_port), reuse_port=True)
+        logging.info(f'{self.host}: listening on advertising port {self.adv_port}')
+
+    def datagram_received(self, data, addr):
+        for line in data.decode(errors='ignore').splitlines():
+            packet = parse_packet(line)
+            if packet is None:
+                continue
+            type_tag, payload = packet
+            if type_tag == HELLO_EMOTIBIT:
+                self.transport.sendto((self.next_packet(HELLO_HOST, [DATA_PORT, '-1']) + '\n').encode(), addr)
+            elif type_tag == PING:
+                self.transport.sendto((self.next_packet(PONG) + '\n').encode(), addr)
+            elif type_tag == EMOTIBIT_CONNECT:
+                ports = dict(zip(payload[::2], payload[1::2]))
+                if CONTROL_PORT in ports and DATA_PORT in ports:
+                    asyncio.ensure_future(self.connect(addr[0], int(ports[CONTROL_PORT]), int(ports[DATA_PORT])))
+
+    async def connect(self, host_ip, control_port, data_port):
+        await self.disconnect()
+        logging.info(f'{self.host}: connecting to {host_ip} control {control_port} data {data_port}')
+        loop = asyncio.get_running_loop()
+        try:
+            reader, self.control_writer = await asyncio.open_connection(host_ip, control_port, local_addr=(self.host, 0))
+        except OSError as e:
+            logging.warning(f'{self.host}: control connection failed: {e}')
+            return
+        self.data_transport, _ = await loop.create_datagram_endpoint(
+            asyncio.DatagramProtocol, local_addr=(self.host, 0))
+        self.data_addr = (host_ip, data_port)
+        self.stream_task = asyncio.ensure_future(self.stream())
+        asyncio.ensure_future(self.read_control(reader))
+
+    async def read_control(self, reader):
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            packet = parse_packet(line.decode(errors='ignore'))
+            if packet is not None:
+                logging.debug(f'{self.host}: control message {packet[0]}')
+        await self.disconnect()
+
+    async def disconnect(self):
+        if self.stream_task is not None:
+            self.stream_task.cancel()
+            self.stream_task = None
+        if self.control_writer is not None:
+            self.control_writer.close()
+            self.control_writer = None
+        if self.data_transport is not None:
+            self.data_transport.close()
+            self.data_transport = None
+
+    def send_data(self, datagram):
+        if self.random.random() < self.loss:
+            self.dropped += 1
+            return
+        self.sent += 1
+        if self.jitter > 0:
+            delay = self.random.uniform(0, self.jitter)
+            asyncio.get_running_loop().call_later(delay, self._sendto, datagram)
+        else:
+            self._sendto(datagram)
+
+    def _sendto(self, datagram):
+        if self.data_transport is not None:
+            self.data_transport.sendto(datagram, self.data_addr)
+
+    async def stream(self):
+        """Send each stream as soon as a packet's worth of samples is due"""
+        start = time.monotonic()
+        emitted = {stream: 0 for stream in STREAMS}
+        period = min(self.samples_per_packet / rate for rate in self.rates.values())
+        while True:
+            await asyncio.sleep(period)
+            now = time.monotonic() - start
+            lines = []
+            for stream, tags in STREAMS.items():
+                rate = self.rates[stream]
+                due = int(now * rate) - emitted[stream]
+                if due < self.samples_per_packet:
+                    continue
+                t = (emitted[stream] + np.arange(due)) / rate
+                block = self.signals.block(stream, t)
+                emitted[stream] += due
+                for tag, row in zip(tags, block):
+                    lines.append(self.next_packet(tag, [f'{v:.4f}' for v in row]))
+            if lines:
+                self.send_data(('\n'.join(lines) + '\n').encode())
+
+
+async def run(args):
+    base = ipaddress.ip_address(args.base_ip)
+    rates = {'imu': args.imu_rate, 'ppg': args.ppg_rate, 'eda': args.eda_rate}
+    devices = [
+        VirtualEmotibit(str(base + i), args.adv_port, rates, args.loss, args.jitter_ms, seed=i)
+        for i in range(args.devices)
+    ]
+    for device in devices:
+        await device.start()
+    print(f"Emulating {len(devices)} EmotiBit(s) on {devices[0].host} .. {devices[-1].host}")
+
+    while True:
+        await asyncio.sleep(10)
+        sent = sum(d.sent for d in devices)
+        dropped = sum(d.dropped for d in devices)
+        logging.info(f'datagrams sent: {sent}, dropped: {dropped}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Emulate EmotiBit devices on the local network stack')
+    parser.add_argument('--devices', type=int, default=1)
+    parser.add_argument('--base-ip', default='127.0.0.1',
+                        help='address of the first device, the others count up from it (127.0.0.0/8 is all loopback on Linux)')
+    parser.add_argument('--adv-port', type=int, default=ADVERTISING_PORT)
+    parser.add_argument('--imu-rate', type=float, default=25)
+    parser.add_argument('--ppg-rate', type=float, default=25)
+    parser.add_argument('--eda-rate', type=float, default=15)
+    parser.add_argument('--loss', type=float, default=0.0, help='probability of dropping a data datagram')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='maximum random delay added to each datagram')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO)
+    try:
+        asyncio.run(run(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
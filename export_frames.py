@@ -0,0 +1,143 @@
+import argparse
+import logging
+import os
+import shutil
+import subprocess
+from multiprocessing import Pool
+import numpy as np
+from pipeline import Plan
+from presets import PRESET_CONFIGS, sampling_rate
+from session import load_session, timestamp_channel
+
+# Per-process state, filled in by _init_worker so each worker loads the
+# session and builds its figure once rather than once per frame
+_worker = {}
+
+
+def frame_times(timestamps, fps, start=None, end=None):
+    """Session-relative end time of every frame to render"""
+    t = timestamps - timestamps[0]
+    first = t[0] if start is None else start
+    last = t[-1] if end is None else min(end, t[-1])
+    return np.arange(first, last, 1.0 / fps)
+
+
+def split_ranges(num_frames, num_chunks):
+    """Split frame indices into contiguous (begin, end) ranges for the pool"""
+    bounds = np.linspace(0, num_frames, num_chunks + 1).astype(int)
+    return [(int(b), int(e)) for b, e in zip(bounds[:-1], bounds[1:]) if e > b]
+
+
+def _build_figure(sensors, width, height, dpi):
+    """Offscreen counterpart of Graph._init_timeseries in accGyrMagPPG_gpu"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    colors = {'r': 'red', 'g': 'green', 'b': 'blue', 'y': 'gold', 'c': 'cyan'}
+    fig, axes = plt.subplots(len(sensors), 1, figsize=(width / dpi, height / dpi), dpi=dpi, squeeze=False)
+    fig.patch.set_facecolor('w')
+    curves = {}
+    for row, (ax, (sensor_name, sensor_info)) in enumerate(zip(axes[:, 0], sensors.items())):
+        ax.grid(True, alpha=0.3)
+        ax.set_ylabel(sensor_name)
+        ax.set_xlabel('Time (s)' if row == len(sensors)-1 else '')
+        curves[sensor_name] = []
+        for name, color in zip(sensor_info['names'], sensor_info['colors']):
+            line, = ax.plot([], [], color=colors.get(color, color), linewidth=1.5, label=name)
+            curves[sensor_name].append(line)
+        ax.legend(loc='upper left')
+    fig.tight_layout()
+    return fig, axes[:, 0], curves
+
+
+def _init_worker(session_path, preset_name, window, out_dir, width, height, dpi):
+    data = load_session(session_path, [preset_name])[preset_name]
+    timestamps = data[timestamp_channel(preset_name)]
+    sensors = PRESET_CONFIGS[preset_name]
+    fig, axes, curves = _build_figure(sensors, width, height, dpi)
+    _worker.update(
+        data=data,
+        t=timestamps - timestamps[0],
+        sensors=sensors,
+        plan=Plan(sensors, sampling_rate(preset_name)),
+        window=window,
+        out_dir=out_dir,
+        fig=fig,
+        axes=axes,
+        curves=curves
+    )
+
+
+def _render_range(task):
+    begin, end, times = task
+    data, t, window = _worker['data'], _worker['t'], _worker['window']
+    for frame, t_end in zip(range(begin, end), times):
+        lo, hi = np.searchsorted(t, [t_end - window, t_end], side='right')
+        x = t[lo:hi]
+        for ax, (sensor_name, sensor_info) in zip(_worker['axes'], _worker['sensors'].items()):
+            # Fancy indexing copies, so the plan can work on the block in place
+            block = _worker['plan'].run(sensor_name, data[sensor_info['channels'], lo:hi])
+            for curve, channel_data in zip(_worker['curves'][sensor_name], block):
+                curve.set_data(x, channel_data)
+            ax.set_xlim(t_end - window, t_end)
+            ax.relim()
+            ax.autoscale_view(scalex=False, scaley=True)
+        _worker['fig'].savefig(os.path.join(_worker['out_dir'], f'frame_{frame:06d}.png'))
+    return end - begin
+
+
+def export_frames(session_path, preset_name, out_dir, window=4.0, fps=10, start=None, end=None,
+                  workers=None, chunks_per_worker=4, width=1600, height=1000, dpi=100):
+    """Render a recorded preset to a PNG sequence, spreading time ranges over a process pool"""
+    os.makedirs(out_dir, exist_ok=True)
+    data = load_session(session_path, [preset_name])[preset_name]
+    times = frame_times(data[timestamp_channel(preset_name)], fps, start, end)
+    workers = workers or os.cpu_count() or 1
+    ranges = split_ranges(len(times), workers * chunks_per_worker)
+    tasks = [(b, e, times[b:e]) for b, e in ranges]
+
+    logging.info(f'Rendering {len(times)} frames of {preset_name} with {workers} workers')
+    done = 0
+    with Pool(workers, _init_worker, (session_path, preset_name, window, out_dir, width, height, dpi)) as pool:
+        for count in pool.imap_unordered(_render_range, tasks):
+            done += count
+            logging.info(f'{done}/{len(times)} frames')
+    return len(times)
+
+
+def encode_video(out_dir, video_path, fps):
+    """Assemble an exported PNG sequence into a video with ffmpeg"""
+    if shutil.which('ffmpeg') is None:
+        raise RuntimeError('ffmpeg not found on PATH')
+    subprocess.run([
+        'ffmpeg', '-y', '-framerate', str(fps),
+        '-i', os.path.join(out_dir, 'frame_%06d.png'),
+        '-pix_fmt', 'yuv420p', video_path
+    ], check=True)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description='Export a recorded EmotiBit session to images or video')
+    parser.add_argument('session', help='session directory written by session.save_session')
+    parser.add_argument('--preset', default='DEFAULT', choices=list(PRESET_CONFIGS))
+    parser.add_argument('--out', default='frames')
+    parser.add_argument('--window', type=float, default=4.0, help='visible window in seconds')
+    parser.add_argument('--fps', type=float, default=10)
+    parser.add_argument('--start', type=float, default=None, help='seconds from session start')
+    parser.add_argument('--end', type=float, default=None, help='seconds from session start')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--video', default=None, help='also encode the frames to this file with ffmpeg')
+    args = parser.parse_args()
+
+    out_dir = os.path.join(args.out, args.preset)
+    export_frames(args.session, args.preset, out_dir, args.window, args.fps,
+                  args.start, args.end, args.workers)
+    if args.video:
+        encode_video(out_dir, args.video, args.fps)
+
+
+if __name__ == '__main__':
+    main()
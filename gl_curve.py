@@ -0,0 +1,238 @@
+import numpy as np
+import pyqtgraph as pg
+from OpenGL import GL
+from OpenGL.GL import shaders
+from PyQt5.QtCore import QRectF
+from PyQt5.QtGui import QPaintEngine
+from axis_range import SlidingMinMax
+
+VERTEX_SHADER = """
+#version 120
+attribute float index;
+attribute float value;
+uniform float head;
+uniform float capacity;
+uniform float x_scale;
+uniform float y_offset;
+uniform mat3 transform;
+void main() {
+    // Oldest sample sits at age 0, the newest at capacity - 1
+    float age = mod(index - head + capacity, capacity);
+    vec3 p = transform * vec3(age * x_scale, value - y_offset, 1.0);
+    gl_Position = vec4(p.xy / p.z, 0.0, 1.0);
+}
+"""
+
+FRAGMENT_SHADER = """
+#version 120
+uniform vec4 color;
+void main() {
+    gl_FragColor = color;
+}
+"""
+
+
+class GLRingCurve(pg.GraphicsObject):
+    """Scrolling curve backed by a persistent vertex buffer used as a ring buffer
+
+    New samples are written into the buffer with glBufferSubData on the next
+    paint, and the scroll position is a shader uniform, so the per-frame
+    upload is proportional to the number of new samples rather than to the
+    window length. A float32 mirror of the ring is kept on the CPU for
+    the constant detrend offset and non-GL painting (e.g. export), and the
+    window min/max are tracked incrementally so bounds never scan it.
+    """
+
+    def __init__(self, capacity, x_span, pen='w', name=None, detrend=True):
+        super().__init__()
+        self.capacity = capacity
+        self.x_span = x_span
+        self.detrend = detrend
+        self.pen = pg.mkPen(pen)
+        self.opts = {'pen': self.pen, 'name': name, 'antialias': True}
+
+        self.values = np.zeros(capacity, dtype=np.float32)
+        self.head = 0
+        self.count = 0
+        self.total = 0.0
+        self.pending = []
+        self.extremes = SlidingMinMax(capacity)
+
+        self.program = None
+        self.index_vbo = None
+        self.value_vbo = None
+
+    def name(self):
+        return self.opts['name']
+
+    def push(self, samples):
+        """Append new samples, evicting the oldest once the ring is full"""
+        samples = np.asarray(samples, dtype=np.float32)[-self.capacity:]
+        n = len(samples)
+        if n == 0:
+            return
+
+        # Keep the running sum for the detrend offset up to date
+        evicted = max(0, self.count + n - self.capacity)
+        if evicted:
+            start = self.head if self.count == self.capacity else 0
+            idx = (start + np.arange(evicted)) % self.capacity
+            self.total -= float(self.values[idx].sum())
+        self.total += float(samples.sum(dtype=np.float64))
+        self.extremes.push(samples)
+
+        first = min(n, self.capacity - self.head)
+        self.values[self.head:self.head + first] = samples[:first]
+        self.pending.append((self.head, self.head + first))
+        if n > first:
+            self.values[:n - first] = samples[first:]
+            self.pending.append((0, n - first))
+        self.head = (self.head + n) % self.capacity
+        self.count = min(self.capacity, self.count + n)
+        self.prepareGeometryChange()
+        self.informViewBoundsChanged()
+        self.update()
+
+    @property
+    def offset(self):
+        if not self.detrend or self.count == 0:
+            return 0.0
+        return self.total / self.count
+
+    def ordered(self):
+        """Samples oldest to newest, detrended, as a new array"""
+        if self.count < self.capacity:
+            y = self.values[:self.count]
+        else:
+            y = np.roll(self.values, -self.head)
+        return y - self.offset
+
+    def boundingRect(self):
+        lo, hi = self.dataBounds(1)
+        if lo is None:
+            return QRectF()
+        return QRectF(0, lo, self.x_span, hi - lo)
+
+    def dataBounds(self, ax, frac=1.0, orthoRange=None):
+        if self.count == 0:
+            return (None, None)
+        if ax == 0:
+            return (0.0, float(self.x_span))
+        offset = self.offset
+        return (float(self.extremes.min - offset), float(self.extremes.max - offset))
+
+    def _x_scale(self):
+        return self.x_span / max(self.capacity - 1, 1)
+
+    def _init_gl(self):
+        self.program = shaders.compileProgram(
+            shaders.compileShader(VERTEX_SHADER, GL.GL_VERTEX_SHADER),
+            shaders.compileShader(FRAGMENT_SHADER, GL.GL_FRAGMENT_SHADER)
+        )
+        self.index_vbo = GL.glGenBuffers(1)
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self.index_vbo)
+        indices = np.arange(self.capacity, dtype=np.float32)
+        GL.glBufferData(GL.GL_ARRAY_BUFFER, indices.nbytes, indices, GL.GL_STATIC_DRAW)
+
+        self.value_vbo = GL.glGenBuffers(1)
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self.value_vbo)
+        GL.glBufferData(GL.GL_ARRAY_BUFFER, self.values.nbytes, self.values, GL.GL_DYNAMIC_DRAW)
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, 0)
+        self.pending.clear()
+
+    def _flush(self):
+        """Upload only the ranges written since the last paint"""
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self.value_vbo)
+        for start, stop in self.pending:
+            GL.glBufferSubData(GL.GL_ARRAY_BUFFER, start * 4, (stop - start) * 4, self.values[start:stop])
+        self.pending.clear()
+
+    def _transform(self, painter):
+        """Item coordinates to normalized device coordinates, as a 3x3 matrix"""
+        t = painter.deviceTransform()
+        item_to_device = np.array([
+            [t.m11(), t.m21(), t.m31()],
+            [t.m12(), t.m22(), t.m32()],
+            [t.m13(), t.m23(), t.m33()]
+        ])
+        device = painter.device()
+        device_to_ndc = np.array([
+            [2.0 / device.width(), 0.0, -1.0],
+            [0.0, -2.0 / device.height(), 1.0],
+            [0.0, 0.0, 1.0]
+        ])
+        return (device_to_ndc @ item_to_device).astype(np.float32)
+
+    def _scissor(self, painter):
+        """Native GL ignores the painter clip, so clip to the ViewBox by hand"""
+        vb = self.getViewBox()
+        if vb is None:
+            return False
+        rect = painter.deviceTransform().mapRect(self.mapRectFromItem(vb, vb.rect()))
+        ratio = painter.device().devicePixelRatioF()
+        height = painter.device().height()
+        GL.glEnable(GL.GL_SCISSOR_TEST)
+        GL.glScissor(int(rect.left() * ratio), int((height - rect.bottom()) * ratio),
+                     int(rect.width() * ratio), int(rect.height() * ratio))
+        return True
+
+    def paint(self, painter, *args):
+        if self.count < 2:
+            return
+        if painter.paintEngine().type() not in (QPaintEngine.OpenGL, QPaintEngine.OpenGL2):
+            self._paint_fallback(painter)
+            return
+
+        painter.beginNativePainting()
+        try:
+            if self.program is None:
+                self._init_gl()
+            self._flush()
+            scissored = self._scissor(painter)
+
+            GL.glUseProgram(self.program)
+            color = self.pen.color()
+            GL.glUniform4f(GL.glGetUniformLocation(self.program, 'color'),
+                           color.redF(), color.greenF(), color.blueF(), color.alphaF())
+            GL.glUniform1f(GL.glGetUniformLocation(self.program, 'head'), float(self.head))
+            GL.glUniform1f(GL.glGetUniformLocation(self.program, 'capacity'), float(self.capacity))
+            GL.glUniform1f(GL.glGetUniformLocation(self.program, 'x_scale'), self._x_scale())
+            GL.glUniform1f(GL.glGetUniformLocation(self.program, 'y_offset'), self.offset)
+            GL.glUniformMatrix3fv(GL.glGetUniformLocation(self.program, 'transform'),
+                                  1, GL.GL_TRUE, self._transform(painter))
+
+            index_loc = GL.glGetAttribLocation(self.program, 'index')
+            value_loc = GL.glGetAttribLocation(self.program, 'value')
+            GL.glEnableVertexAttribArray(index_loc)
+            GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self.index_vbo)
+            GL.glVertexAttribPointer(index_loc, 1, GL.GL_FLOAT, GL.GL_FALSE, 0, None)
+            GL.glEnableVertexAttribArray(value_loc)
+            GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self.value_vbo)
+            GL.glVertexAttribPointer(value_loc, 1, GL.GL_FLOAT, GL.GL_FALSE, 0, None)
+
+            GL.glLineWidth(max(self.pen.widthF(), 1.0))
+            if self.count < self.capacity:
+                GL.glDrawArrays(GL.GL_LINE_STRIP, 0, self.count)
+            else:
+                # Two strips around the wrap point, oldest half first
+                GL.glDrawArrays(GL.GL_LINE_STRIP, self.head, self.capacity - self.head)
+                if self.head > 0:
+                    GL.glDrawArrays(GL.GL_LINE_STRIP, 0, self.head)
+                    GL.glDrawElements(GL.GL_LINES, 2, GL.GL_UNSIGNED_INT,
+                                      np.array([self.capacity - 1, 0], dtype=np.uint32))
+
+            GL.glDisableVertexAttribArray(index_loc)
+            GL.glDisableVertexAttribArray(value_loc)
+            GL.glBindBuffer(GL.GL_ARRAY_BUFFER, 0)
+            GL.glUseProgram(0)
+            if scissored:
+                GL.glDisable(GL.GL_SCISSOR_TEST)
+        finally:
+            painter.endNativePainting()
+
+    def _paint_fallback(self, painter):
+        y = self.ordered()
+        x = (np.arange(len(y)) + self.capacity - len(y)) * self._x_scale()
+        painter.setRenderHint(painter.Antialiasing, True)
+        painter.setPen(self.pen)
+        painter.drawPath(pg.arrayToQPath(x, y))
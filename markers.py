@@ -0,0 +1,128 @@
+import argparse
+import os
+import numpy as np
+from brainflow.board_shim import BoardShim
+from presets import BOARD_ID, PRESET_MAP
+from session import preset_file, session_presets, timestamp_channel
+
+# Alongside each <PRESET>.csv a session gets:
+#   <PRESET>.idx  - sparse seek index, (timestamp, byte offset) every `stride` rows
+#   markers.csv   - every marker as (timestamp, value, preset number), sorted by time
+# Both are built once after recording, so finding and reading the data around
+# a marker is a binary search plus a read of just the rows in the window.
+MARKERS_FILE = 'markers.csv'
+
+
+def marker_channel(preset_name):
+    return BoardShim.get_marker_channel(BOARD_ID, PRESET_MAP[preset_name])
+
+
+def index_file(path, preset_name):
+    return os.path.join(path, f'{preset_name}.idx')
+
+
+def build_index(path, stride=256):
+    """Scan a finished recording once, writing the seek indexes and marker list
+
+    Returns the number of markers, or None when there is no recording at
+    `path` (the device never connected).
+    """
+    if not os.path.isdir(path):
+        return None
+    markers = []
+    for preset_name in session_presets(path):
+        ts_col = timestamp_channel(preset_name)
+        marker_col = marker_channel(preset_name)
+        seek = []
+        offset = 0
+        with open(preset_file(path, preset_name), 'rb') as f:
+            for row, line in enumerate(f):
+                fields = line.split(b'\t')
+                if len(fields) <= max(ts_col, marker_col):
+                    offset += len(line)
+                    continue
+                timestamp = float(fields[ts_col])
+                if row % stride == 0:
+                    seek.append((timestamp, offset))
+                value = float(fields[marker_col])
+                if value != 0:
+                    markers.append((timestamp, value, int(PRESET_MAP[preset_name])))
+                offset += len(line)
+        np.savetxt(index_file(path, preset_name), np.array(seek).reshape(-1, 2), fmt=['%.6f', '%d'], delimiter='\t')
+
+    markers.sort()
+    np.savetxt(os.path.join(path, MARKERS_FILE), np.array(markers).reshape(-1, 3),
+               fmt=['%.6f', '%g', '%d'], delimiter='\t')
+    return len(markers)
+
+
+class MarkerIndex:
+    """Random access to the data around markers of an indexed session"""
+
+    def __init__(self, path):
+        self.path = path
+        markers = np.loadtxt(os.path.join(path, MARKERS_FILE), delimiter='\t', ndmin=2)
+        self.timestamps = markers[:, 0] if markers.size else np.empty(0)
+        self.values = markers[:, 1] if markers.size else np.empty(0)
+        self.seek = {}
+        for preset_name in session_presets(path):
+            seek = np.loadtxt(index_file(path, preset_name), delimiter='\t', ndmin=2)
+            self.seek[preset_name] = (seek[:, 0], seek[:, 1].astype(np.int64))
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def find(self, timestamp):
+        """Position of the first marker at or after `timestamp`"""
+        return int(np.searchsorted(self.timestamps, timestamp, side='left'))
+
+    def between(self, t0, t1):
+        """(timestamps, values) of the markers in [t0, t1]"""
+        lo = np.searchsorted(self.timestamps, t0, side='left')
+        hi = np.searchsorted(self.timestamps, t1, side='right')
+        return self.timestamps[lo:hi], self.values[lo:hi]
+
+    def read_range(self, preset_name, t0, t1):
+        """Rows of one preset with timestamps in [t0, t1], read from the nearest seek point"""
+        seek_ts, seek_offsets = self.seek[preset_name]
+        ts_col = timestamp_channel(preset_name)
+        start = max(int(np.searchsorted(seek_ts, t0, side='right')) - 1, 0)
+        rows = []
+        with open(preset_file(self.path, preset_name), 'rb') as f:
+            if len(seek_offsets):
+                f.seek(int(seek_offsets[start]))
+            for line in f:
+                values = np.array(line.split(b'\t'), dtype=np.float64)
+                if values[ts_col] > t1:
+                    break
+                if values[ts_col] >= t0:
+                    rows.append(values)
+        if not rows:
+            return np.empty((0, 0))
+        return np.array(rows).T
+
+    def around(self, i, before=5.0, after=5.0, presets=None):
+        """{preset_name: data} for `before`/`after` seconds around marker i"""
+        t = self.timestamps[i]
+        names = presets if presets is not None else list(self.seek)
+        return {name: self.read_range(name, t - before, t + after) for name in names}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Index a recorded session and list its markers')
+    parser.add_argument('session')
+    parser.add_argument('--stride', type=int, default=256)
+    args = parser.parse_args()
+
+    count = build_index(args.session, args.stride)
+    if count is None:
+        print(f"No session at {args.session}")
+        return
+    index = MarkerIndex(args.session)
+    print(f"Indexed {count} markers")
+    for t, value in zip(index.timestamps, index.values):
+        print(f"  {t:.3f}  marker {value:g}")
+
+
+if __name__ == '__main__':
+    main()
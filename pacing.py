@@ -0,0 +1,77 @@
+import time
+from PyQt5.QtCore import QTimer, Qt
+
+
+class FramePacer:
+    """Drive a render callback at a rate that follows data arrival and render cost
+
+    The timer polls at the slower of the display rate and the data rate and
+    only calls render() when has_new_data() says something arrived. When
+    rendering takes more than half of the frame interval the interval
+    grows, skipping frames, and it shrinks back once rendering is cheap
+    again. `rate` is the render rate currently being achieved.
+    """
+
+    def __init__(self, render, has_new_data, display_hz=60, data_hz=None, min_hz=2, on_rate=None):
+        self.render = render
+        self.has_new_data = has_new_data
+        self.display_hz = display_hz
+        self.base_interval = 1000.0 / min(display_hz, data_hz or display_hz)
+        self.max_interval = 1000.0 / min_hz
+        self.interval = self.base_interval
+        self.on_rate = on_rate
+
+        self.render_ms = 0.0
+        self.rate = 0.0
+        self.rendered = 0
+        self.skipped = 0
+        self.window_rendered = 0
+        self.window_start = time.perf_counter()
+
+        self.timer = QTimer()
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.timeout.connect(self._tick)
+
+    def start(self):
+        self.timer.start(int(self.interval))
+
+    def stop(self):
+        self.timer.stop()
+
+    def set_data_rate(self, data_hz):
+        """No point polling faster than samples arrive"""
+        self.base_interval = 1000.0 / min(self.display_hz, data_hz or self.display_hz)
+        self.interval = max(self.interval, self.base_interval)
+        self.timer.setInterval(int(self.interval))
+
+    def _tick(self):
+        if self.has_new_data():
+            start = time.perf_counter()
+            self.render()
+            elapsed = time.perf_counter() - start
+            self.rendered += 1
+            self.window_rendered += 1
+            self.render_ms = 0.8 * self.render_ms + 0.2 * elapsed * 1000.0
+            self._adapt()
+        else:
+            self.skipped += 1
+
+        # Achieved render rate over roughly the last second
+        now = time.perf_counter()
+        if now - self.window_start >= 1.0:
+            self.rate = self.window_rendered / (now - self.window_start)
+            self.window_rendered = 0
+            self.window_start = now
+            if self.on_rate is not None:
+                self.on_rate(self.rate)
+
+    def _adapt(self):
+        if self.render_ms > 0.5 * self.interval:
+            interval = min(self.interval * 1.5, self.max_interval)
+        elif self.render_ms < 0.25 * self.interval:
+            interval = max(self.interval / 1.2, self.base_interval)
+        else:
+            return
+        if int(interval) != int(self.interval):
+            self.timer.setInterval(int(interval))
+        self.interval = interval
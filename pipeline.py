@@ -0,0 +1,213 @@
+import numpy as np
+from brainflow.data_filter import DataFilter, FilterTypes
+
+# Sensor configs may declare a 'pipeline': a list of stages applied in order
+# to all channels of the sensor at once, each either a stage name or a dict
+# with 'stage' plus its parameters, e.g.
+#   'pipeline': ['detrend', {'stage': 'bandpass', 'low': 0.5, 'high': 4.0}, 'envelope', 'rms']
+# Transform stages rewrite the (channels, samples) block in place:
+#   detrend   - subtract each channel's mean (kept as the offset)
+#   linear    - subtract each channel's least-squares line
+#   lowpass, highpass, bandpass - causal Butterworth filter ('low'/'high'
+#               cutoffs in Hz, 'order'), so the newest samples are final
+#   smooth    - trailing moving average over 'window' seconds
+#   rectify   - absolute value
+#   envelope  - magnitude of the analytic signal
+# Feature stages leave the block alone and record one value per channel in
+# Plan.features[sensor][stage]: mean, std, rms, peak_freq.
+# Without a 'pipeline', a sensor gets ['detrend'] when its 'detrend' flag is
+# set (the default), like the viewers always did.
+
+
+def _spec(stage):
+    return {'stage': stage} if isinstance(stage, str) else dict(stage)
+
+
+def _detrend(rate, spec, features):
+    def run(block, offsets):
+        np.mean(block, axis=1, out=offsets)
+        block -= offsets[:, None]
+    return run
+
+
+def _linear(rate, spec, features):
+    def run(block, offsets):
+        n = block.shape[1]
+        t = np.arange(n, dtype=block.dtype) - (n - 1) / 2.0
+        np.mean(block, axis=1, out=offsets)
+        slope = (block * t).sum(axis=1) / max((t * t).sum(), 1.0)
+        block -= offsets[:, None] + slope[:, None] * t
+    return run
+
+
+def _butterworth(rate, spec, features):
+    kind = spec['stage']
+    low = spec.get('low')
+    high = spec.get('high')
+    order = spec.get('order', 4)
+    # The filter starts from rest, so it first runs over a stretch of the
+    # oldest value held constant: by the time the window begins it has
+    # settled on that level and there is no start-up step to ring out
+    lowest = low if kind != 'lowpass' else high
+    pad = int(np.ceil(10.0 * rate / lowest))
+    scratch = {}
+
+    def run(block, offsets):
+        n = block.shape[1]
+        if scratch.get('n') != n:
+            scratch.update(n=n, row=np.empty(pad + n))
+        row = scratch['row']
+        for channel in block:
+            row[:pad] = channel[0]
+            row[pad:] = channel
+            if kind == 'bandpass':
+                DataFilter.perform_bandpass(row, int(rate), low, high, order, FilterTypes.BUTTERWORTH.value, 0)
+            elif kind == 'highpass':
+                DataFilter.perform_highpass(row, int(rate), low, order, FilterTypes.BUTTERWORTH.value, 0)
+            else:
+                DataFilter.perform_lowpass(row, int(rate), high, order, FilterTypes.BUTTERWORTH.value, 0)
+            channel[:] = row[pad:]
+    return run
+
+
+def _smooth(rate, spec, features):
+    k = max(int(round(spec.get('window', 0.2) * rate)), 1)
+
+    def run(block, offsets):
+        n = block.shape[1]
+        total = np.cumsum(block, axis=1, dtype=np.float64)
+        out = total.copy()
+        out[:, k:] -= total[:, :-k]
+        counts = np.minimum(np.arange(1, n + 1), k)
+        block[:] = out / counts
+    return run
+
+
+def _rectify(rate, spec, features):
+    def run(block, offsets):
+        np.abs(block, out=block)
+    return run
+
+
+def _envelope(rate, spec, features):
+    def run(block, offsets):
+        n = block.shape[1]
+        if n < 2:
+            return
+        h = np.zeros(n)
+        h[0] = 1.0
+        h[1:(n + 1) // 2] = 2.0
+        if n % 2 == 0:
+            h[n // 2] = 1.0
+        block[:] = np.abs(np.fft.ifft(np.fft.fft(block, axis=1) * h, axis=1))
+    return run
+
+
+def _feature(rate, spec, features):
+    name = spec['stage']
+
+    def run(block, offsets):
+        if block.shape[1] == 0:
+            return
+        if name == 'mean':
+            features[name] = block.mean(axis=1)
+        elif name == 'std':
+            features[name] = block.std(axis=1)
+        elif name == 'rms':
+            features[name] = np.sqrt((block.astype(np.float64) ** 2).mean(axis=1))
+        elif name == 'peak_freq':
+            spectrum = np.abs(np.fft.rfft(block - block.mean(axis=1, keepdims=True), axis=1))
+            freqs = np.fft.rfftfreq(block.shape[1], 1.0 / rate)
+            features[name] = freqs[np.argmax(spectrum[:, 1:], axis=1) + 1] if len(freqs) > 1 else np.zeros(len(block))
+    return run
+
+
+STAGES = {
+    'detrend': _detrend,
+    'linear': _linear,
+    'lowpass': _butterworth,
+    'highpass': _butterworth,
+    'bandpass': _butterworth,
+    'smooth': _smooth,
+    'rectify': _rectify,
+    'envelope': _envelope,
+    'mean': _feature,
+    'std': _feature,
+    'rms': _feature,
+    'peak_freq': _feature
+}
+FEATURES = ('mean', 'std', 'rms', 'peak_freq')
+
+
+def declared_pipeline(sensor_info):
+    if 'pipeline' in sensor_info:
+        return [_spec(stage) for stage in sensor_info['pipeline']]
+    return [{'stage': 'detrend'}] if sensor_info.get('detrend', True) else []
+
+
+class Plan:
+    """The pipelines of a sensor config, compiled once for a sampling rate
+
+    Stage parameters are resolved and their scratch buffers kept between
+    runs, so running a sensor is a fixed list of whole
+    block operations. The same plan drives the live viewers and the
+    headless tools.
+    """
+
+    def __init__(self, sensors, sampling_rate):
+        self.sampling_rate = sampling_rate
+        self.stages = {}
+        self.features = {}
+        # Sensors whose output is the input minus a per-channel offset
+        self.shift_only = {}
+        for sensor_name, sensor_info in sensors.items():
+            specs = declared_pipeline(sensor_info)
+            for spec in specs:
+                if spec['stage'] not in STAGES:
+                    raise ValueError(f"{sensor_name}: unknown pipeline stage {spec['stage']!r}")
+            self.features[sensor_name] = {}
+            self.stages[sensor_name] = [
+                (STAGES[spec['stage']](sampling_rate, spec, self.features[sensor_name]), spec['stage'] in FEATURES)
+                for spec in specs
+            ]
+            self.shift_only[sensor_name] = all(spec['stage'] in ('detrend',) + FEATURES for spec in specs)
+
+    def run(self, sensor_name, block, offsets=None, active=None):
+        """Process a (channels, samples) block in place
+
+        offsets receives the per-channel value subtracted by detrend, which
+        is only meaningful when shift_only[sensor_name] is set. active is an
+        optional per-channel mask (see quality.py): feature stages only run
+        on active channels and report NaN for the others, and are skipped
+        entirely when none is active.
+        """
+        if offsets is None:
+            offsets = np.zeros(block.shape[0], dtype=block.dtype)
+        else:
+            offsets[:] = 0
+        if block.shape[1] == 0:
+            return block
+        gated = active is not None and not active.all()
+        for stage, feature in self.stages[sensor_name]:
+            if not feature or not gated:
+                stage(block, offsets)
+            elif active.any():
+                self._run_gated(sensor_name, stage, block[active], offsets, active)
+            else:
+                self._clear_features(sensor_name)
+        return block
+
+    def _run_gated(self, sensor_name, stage, block, offsets, active):
+        features = self.features[sensor_name]
+        before = dict(features)
+        stage(block, offsets[active])
+        for name, values in features.items():
+            if values is not before.get(name):
+                full = np.full(len(active), np.nan)
+                full[active] = values
+                features[name] = full
+
+    def _clear_features(self, sensor_name):
+        features = self.features[sensor_name]
+        for name in features:
+            features[name] = np.full_like(features[name], np.nan, dtype=np.float64)
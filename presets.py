@@ -0,0 +1,83 @@
+from brainflow.board_shim import BoardShim, BoardIds, BrainFlowPresets
+
+BOARD_ID = BoardIds.EMOTIBIT_BOARD.value
+
+PRESET_MAP = {
+    'DEFAULT': BrainFlowPresets.DEFAULT_PRESET,
+    'AUXILIARY': BrainFlowPresets.AUXILIARY_PRESET,
+    'ANCILLARY': BrainFlowPresets.ANCILLARY_PRESET
+}
+
+# Channel configurations for different presets; 'pipeline' (see pipeline.py)
+# declares the processing, otherwise 'detrend' decides. 'quality' (see
+# quality.py) adds signal-quality checks beyond flatline and clipping
+PRESET_CONFIGS = {
+    'DEFAULT': {
+        'Accelerometer': {
+            'channels': [1,2,3],
+            'detrend': True,
+            'colors': ['r', 'g', 'b'],
+            'names': ['X', 'Y', 'Z']
+        },
+        'Gyroscope': {
+            'channels': [4,5,6],
+            'detrend': True,
+            'colors': ['r', 'g', 'b'],
+            'names': ['X', 'Y', 'Z']
+        },
+        'Magnetometer': {
+            'channels': [7,8,9],
+            'detrend': True,
+            'colors': ['r', 'g', 'b'],
+            'names': ['X', 'Y', 'Z']
+        }
+    },
+    'AUXILIARY': {
+        'PPG_IR': {
+            'channels': [1],
+            'detrend': True,
+            'pipeline': ['detrend', {'stage': 'bandpass', 'low': 0.5, 'high': 4.0}, 'peak_freq'],
+            'quality': {'checks': ['snr_db', 'perfusion']},
+            'colors': ['r'],
+            'names': ['IR']
+        },
+        'PPG_Red': {
+            'channels': [2],
+            'detrend': True,
+            'pipeline': ['detrend', {'stage': 'bandpass', 'low': 0.5, 'high': 4.0}],
+            'quality': {'checks': ['snr_db', 'perfusion']},
+            'colors': ['darkred'],
+            'names': ['Red']
+        },
+        'PPG_Green': {
+            'channels': [3],
+            'detrend': True,
+            'pipeline': ['detrend', {'stage': 'bandpass', 'low': 0.5, 'high': 4.0}],
+            'quality': {'checks': ['snr_db', 'perfusion']},
+            'colors': ['g'],
+            'names': ['Green']
+        }
+    },
+    'ANCILLARY': {
+        'Biometrics': {
+            'channels': [1,2],
+            'detrend': False,
+            # Slow and coarsely quantized, so a value can legitimately hold for a while
+            'quality': {'flat_seconds': 60.0},
+            'colors': ['y', 'c'],
+            'names': ['EDA', 'Temp']
+        }
+    }
+}
+
+# Presets that get a spectrogram panel next to their time series
+SPECTROGRAM_PRESETS = ('DEFAULT', 'AUXILIARY')
+
+
+def sampling_rate(preset_name):
+    return BoardShim.get_sampling_rate(BOARD_ID, PRESET_MAP[preset_name])
+
+
+def window_points(preset_name, seconds):
+    """Number of samples a window of `seconds` spans at the preset's own rate"""
+    return int(round(seconds * sampling_rate(preset_name)))
@@ -0,0 +1,32 @@
+# EmotiBit network protocol, as used by BrainFlow's EMOTIBIT_BOARD:
+# the host sends HELLO_EMOTIBIT to the advertising port and the device answers
+# HELLO_HOST; the host then sends EMOTIBIT_CONNECT with its control (TCP) and
+# data (UDP) ports, the device connects to the control port and streams data
+# packets to the data port. Every packet is one text line:
+# timestamp,packet_number,data_length,type_tag,protocol_version,reliability[,payload...]
+ADVERTISING_PORT = 3131
+PROTOCOL_VERSION = 1
+DATA_RELIABILITY = 100
+
+HELLO_EMOTIBIT = 'HE'
+HELLO_HOST = 'HH'
+EMOTIBIT_CONNECT = 'EC'
+PING = 'PN'
+PONG = 'PO'
+CONTROL_PORT = 'CP'
+DATA_PORT = 'DP'
+
+
+def make_packet(timestamp, packet_number, type_tag, payload=()):
+    header = f'{timestamp},{packet_number},{len(payload)},{type_tag},{PROTOCOL_VERSION},{DATA_RELIABILITY}'
+    if payload:
+        return header + ',' + ','.join(payload)
+    return header
+
+
+def parse_packet(line):
+    """Return (type_tag, payload fields) of one packet line, or None if malformed"""
+    fields = line.strip().split(',')
+    if len(fields) < 6:
+        return None
+    return fields[3], fields[6:]
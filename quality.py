@@ -0,0 +1,179 @@
+import numpy as np
+from axis_range import SlidingMinMax
+
+# Per-channel quality levels and the colours the viewers show them in
+GOOD, FAIR, BAD = 0, 1, 2
+LEVEL_NAMES = ('good', 'fair', 'bad')
+LEVEL_COLORS = ('#2ca02c', '#ff7f0e', '#d62728')
+
+# (fair below/above, bad below/above) for each metric
+THRESHOLDS = {
+    'clipping': (0.01, 0.05),   # share of the window at or beyond the sensor's limits
+    'snr_db': (6.0, 0.0),       # signal over first-difference noise
+    'perfusion': (0.1, 0.02)    # PPG AC/DC in percent
+}
+
+
+class SignalQuality:
+    """Sliding-window quality metrics for the channels of one sensor
+
+    Every push does a fixed amount of work per new sample: the samples go
+    into a ring, and running sums of values and first differences are
+    updated by what enters and what leaves it (re-summed exactly once per
+    lap of the ring, so rounding cannot build up over a long session).
+    Window min/max come from SlidingMinMax. Metrics per channel:
+      flatline  - no change for `flat_seconds`
+      clipping  - share of the window at or beyond `limits`, the sensor's
+                  hard range; without limits nothing counts as clipped, since
+                  slow quantized signals sit on their window extremes for
+                  long stretches without anything being wrong
+      snr_db    - variance over the white-noise variance implied by the
+                  first differences
+      perfusion - 100 x (max - min) / mean, for PPG
+    `checks` picks which of snr_db and perfusion count towards the level;
+    flatline and clipping always do.
+    """
+
+    def __init__(self, num_channels, rate, window=5.0, flat_seconds=1.0, limits=None, checks=()):
+        self.capacity = max(int(window * rate), 2)
+        self.flat_samples = max(int(flat_seconds * rate), 1)
+        self.limits = limits
+        self.checks = set(checks)
+        self.values = np.zeros((num_channels, self.capacity))
+        self.diffs = np.zeros((num_channels, self.capacity))
+        self.clipped = np.zeros((num_channels, self.capacity))
+        self.sums = np.zeros((5, num_channels))  # values, squares, diffs, squared diffs, clipped
+        self.extremes = [SlidingMinMax(self.capacity) for _ in range(num_channels)]
+        self.reference = None
+        self.last = None
+        self.flat_run = np.zeros(num_channels, dtype=np.int64)
+        self.pos = 0
+        self.count = 0
+
+    def push(self, samples):
+        """Feed a (channels, n) block of new raw samples"""
+        n = samples.shape[1]
+        if n == 0:
+            return
+        samples = np.asarray(samples, dtype=np.float64)
+        if self.reference is None:
+            # Sums are kept relative to the first sample, away from large DC levels
+            self.reference = samples[:, 0].copy()
+            self.last = samples[:, 0].copy()
+        diffs = np.diff(samples, axis=1, prepend=self.last[:, None])
+        self.last = samples[:, -1].copy()
+
+        # Length of the current run of unchanged samples, continuing the last push
+        still = diffs == 0
+        counts = np.cumsum(still, axis=1)
+        reset = np.maximum.accumulate(np.where(still, 0, counts), axis=1)
+        broken = np.logical_or.accumulate(~still, axis=1)
+        run = counts - reset + np.where(broken, 0, self.flat_run[:, None])
+        self.flat_run = np.minimum(run[:, -1], self.flat_samples)
+
+        for tracker, row in zip(self.extremes, samples):
+            tracker.push(row)
+        if self.limits is not None:
+            clipped = (samples <= self.limits[0]) | (samples >= self.limits[1])
+        else:
+            clipped = np.zeros(samples.shape, dtype=bool)
+
+        # Keep only what fits, then write it over the oldest slots
+        if n > self.capacity:
+            samples, diffs, clipped = samples[:, -self.capacity:], diffs[:, -self.capacity:], clipped[:, -self.capacity:]
+            n = self.capacity
+        slots = (self.pos + np.arange(n)) % self.capacity
+        shifted = samples - self.reference[:, None]
+        self.sums -= self._sums(self.values[:, slots], self.diffs[:, slots], self.clipped[:, slots])
+        self.sums += self._sums(shifted, diffs, clipped)
+        self.values[:, slots] = shifted
+        self.diffs[:, slots] = diffs
+        self.clipped[:, slots] = clipped
+
+        wrapped = self.pos + n >= self.capacity
+        self.pos = (self.pos + n) % self.capacity
+        self.count = min(self.count + n, self.capacity)
+        if wrapped:
+            self.sums[:] = self._sums(self.values, self.diffs, self.clipped)
+
+    @staticmethod
+    def _sums(values, diffs, clipped):
+        return np.array([values.sum(axis=1), (values ** 2).sum(axis=1),
+                         diffs.sum(axis=1), (diffs ** 2).sum(axis=1), clipped.sum(axis=1)])
+
+    def metrics(self):
+        """{metric: per-channel array} over the current window"""
+        n = max(self.count, 1)
+        mean = self.sums[0] / n
+        var = np.maximum(self.sums[1] / n - mean ** 2, 0.0)
+        d_mean = self.sums[2] / n
+        noise = np.maximum(self.sums[3] / n - d_mean ** 2, 0.0) / 2.0
+        tiny = 1e-12
+        lo = np.array([t.min if t.min is not None else 0.0 for t in self.extremes])
+        hi = np.array([t.max if t.max is not None else 0.0 for t in self.extremes])
+        level = mean + (self.reference if self.reference is not None else 0.0)
+        return {
+            'flatline': self.flat_run >= self.flat_samples,
+            'clipping': self.sums[4] / n,
+            # Floored at -30 dB, where the window is all noise
+            'snr_db': 10.0 * np.log10(np.maximum(var - noise, 1e-3 * noise + tiny) / np.maximum(noise, tiny)),
+            'perfusion': 100.0 * (hi - lo) / np.maximum(np.abs(level), tiny)
+        }
+
+    def levels(self):
+        """GOOD, FAIR or BAD per channel, at best FAIR until the window has filled once"""
+        m = self.metrics()
+        levels = np.full(len(self.values), GOOD)
+        fair, bad = THRESHOLDS['clipping']
+        levels = np.maximum(levels, np.where(m['clipping'] > bad, BAD, np.where(m['clipping'] > fair, FAIR, GOOD)))
+        for name in ('snr_db', 'perfusion'):
+            if name in self.checks:
+                fair, bad = THRESHOLDS[name]
+                levels = np.maximum(levels, np.where(m[name] < bad, BAD, np.where(m[name] < fair, FAIR, GOOD)))
+        if self.count < self.capacity:
+            levels = np.maximum(levels, FAIR)
+        levels[m['flatline']] = BAD
+        return levels
+
+
+class QualityMonitor:
+    """SignalQuality for every sensor of a config, laid out like ChannelSubset/ChannelRing rows
+
+    A sensor config may carry 'quality': {'checks': [...], 'limits': (lo, hi),
+    'flat_seconds': s}.
+    `active` is True for every row that is not BAD, for gating pipelines.
+    """
+
+    def __init__(self, sensors, rate, window=5.0):
+        self.sensors = sensors
+        self.quality = {}
+        self.slices = {}
+        start = 0
+        for sensor_name, sensor_info in sensors.items():
+            options = sensor_info.get('quality', {})
+            channels = sensor_info['channels']
+            self.quality[sensor_name] = SignalQuality(
+                len(channels), rate, window, flat_seconds=options.get('flat_seconds', 1.0),
+                limits=options.get('limits'), checks=options.get('checks', ()))
+            self.slices[sensor_name] = slice(start, start + len(channels))
+            start += len(channels)
+        self.level = np.full(start, FAIR)
+        self.active = np.ones(start, dtype=bool)
+
+    def push(self, data):
+        """Feed a raw board array holding only samples not seen before"""
+        if data.shape[1] == 0:
+            return
+        for sensor_name, quality in self.quality.items():
+            quality.push(data[self.sensors[sensor_name]['channels']])
+            self.level[self.slices[sensor_name]] = quality.levels()
+        np.not_equal(self.level, BAD, out=self.active)
+
+    def badges(self, sensor_name):
+        """HTML dots, one per channel, coloured by its level"""
+        names = self.sensors[sensor_name]['names']
+        levels = self.level[self.slices[sensor_name]]
+        return ' '.join(
+            f'<span style="color:{LEVEL_COLORS[level]}">&#9679;</span> {name}'
+            for name, level in zip(names, levels)
+        )
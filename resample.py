@@ -0,0 +1,86 @@
+import numpy as np
+from brainflow.board_shim import BoardShim
+from presets import BOARD_ID, PRESET_MAP, sampling_rate
+from session import timestamp_channel
+
+
+def common_timebase(timestamps, rate):
+    """Evenly spaced times at `rate` Hz covering the span all streams share
+
+    `timestamps` is a list of 1-D board timestamp arrays, one per stream.
+    """
+    start = max(t[0] for t in timestamps)
+    stop = min(t[-1] for t in timestamps)
+    if stop <= start:
+        return np.empty(0)
+    return start + np.arange(int(np.floor((stop - start) * rate)) + 1) / rate
+
+
+def resample(timestamps, data, times):
+    """Linearly interpolate every row of `data` onto `times` in one pass
+
+    The neighbour lookup is done once with searchsorted and shared by all
+    rows, instead of calling np.interp row by row.
+    """
+    idx = np.clip(np.searchsorted(timestamps, times, side='right'), 1, len(timestamps) - 1)
+    t0 = timestamps[idx - 1]
+    t1 = timestamps[idx]
+    span = t1 - t0
+    weight = np.divide(times - t0, span, out=np.zeros_like(times), where=span > 0)
+    np.clip(weight, 0.0, 1.0, out=weight)
+    return data[:, idx - 1] * (1.0 - weight) + data[:, idx] * weight
+
+
+def as_of(timestamps, values, times):
+    """Latest value at or before each of `times` (the first value before the first timestamp)"""
+    idx = np.clip(np.searchsorted(timestamps, times, side='right') - 1, 0, len(timestamps) - 1)
+    return values[idx]
+
+
+def place_events(timestamps, values, times):
+    """Put each nonzero value on the nearest of `times` once, zero elsewhere
+
+    Markers are single-sample events, so interpolating them would smear a
+    marker of 1 into fractions on the neighbouring samples.
+    """
+    out = np.zeros(len(times))
+    events = np.flatnonzero(values)
+    if len(times) == 0:
+        return out
+    t = timestamps[events]
+    # Events outside the shared span have no time to land on
+    keep = (t >= times[0]) & (t <= times[-1])
+    events, t = events[keep], t[keep]
+    idx = np.searchsorted(times, t)
+    left = np.clip(idx - 1, 0, len(times) - 1)
+    right = np.clip(idx, 0, len(times) - 1)
+    nearest = np.where(np.abs(times[left] - t) <= np.abs(times[right] - t), left, right)
+    out[nearest] = values[events]
+    return out
+
+
+def resample_session(preset_data, rate=None):
+    """Put every preset of a session onto one shared timebase
+
+    Returns (times, {preset_name: data}) where each data array keeps the
+    preset's row layout. The rate defaults to the fastest preset's rate.
+    Sensor rows are interpolated; the package number is taken as of each
+    time and markers land on their nearest time.
+    """
+    if rate is None:
+        rate = max(sampling_rate(name) for name in preset_data)
+    stamps = {name: data[timestamp_channel(name)] for name, data in preset_data.items()}
+    times = common_timebase(list(stamps.values()), rate)
+    resampled = {}
+    for name, data in preset_data.items():
+        # Board timestamps can repeat or step back after packet loss
+        order = np.argsort(stamps[name], kind='stable')
+        t = stamps[name][order]
+        data = data[:, order]
+        resampled[name] = resample(t, data, times)
+        resampled[name][timestamp_channel(name)] = times
+        package = BoardShim.get_package_num_channel(BOARD_ID, PRESET_MAP[name])
+        resampled[name][package] = as_of(t, data[package], times)
+        marker = BoardShim.get_marker_channel(BOARD_ID, PRESET_MAP[name])
+        resampled[name][marker] = place_events(t, data[marker], times)
+    return times, resampled
@@ -0,0 +1,258 @@
+import logging
+import sys
+import numpy as np
+from brainflow.board_shim import BoardShim
+from presets import BOARD_ID, PRESET_CONFIGS, PRESET_MAP, sampling_rate
+from session import timestamp_channel
+
+# Alert rules per preset and sensor group of PRESET_CONFIGS. Each rule reads
+# one channel of the group by name, or 'magnitude' for the vector length of
+# the whole group, and turns it into a signal:
+#   'value'  - the samples as they are
+#   'rate'   - change over `window` seconds (default one sample), per second
+#   'change' - difference against the sample `window` seconds earlier
+#   'mean'   - trailing mean over `window` seconds
+# and fires when the signal is above `above` or below `below` for at least
+# `for` seconds, then stays quiet for `debounce` seconds.
+RULES = {
+    'DEFAULT': {
+        'Accelerometer': [
+            {'name': 'free_fall', 'channel': 'magnitude', 'signal': 'value', 'below': 0.4, 'for': 0.1, 'debounce': 2.0},
+            {'name': 'impact', 'channel': 'magnitude', 'signal': 'value', 'above': 3.0, 'debounce': 2.0}
+        ]
+    },
+    'ANCILLARY': {
+        'Biometrics': [
+            {'name': 'eda_spike', 'channel': 'EDA', 'signal': 'rate', 'window': 1.0, 'above': 0.5, 'debounce': 5.0},
+            {'name': 'temp_drift', 'channel': 'Temp', 'signal': 'change', 'window': 60.0,
+             'above': 0.5, 'below': -0.5, 'debounce': 60.0}
+        ]
+    }
+}
+
+
+class _DeviceState:
+    """What evaluation carries from one chunk of a device's preset to the next"""
+
+    def __init__(self, num_rules, num_rows, num_features):
+        self.tail = np.empty((num_rows, 0))
+        # Real samples seen per feature source, -1 until its stream has started
+        self.seen = np.full(num_features, -1, dtype=np.int64)
+        self.run = np.zeros(num_rules, dtype=np.int64)
+        self.active = np.zeros(num_rules, dtype=bool)
+        self.last_fire = np.full(num_rules, -np.inf)
+
+
+class PresetRules:
+    """The rules of one preset, compiled into arrays for one vectorized pass per chunk
+
+    Rules reading the same signal share one feature row, and every
+    threshold, duration and edge test runs over a (rules, samples) array,
+    so adding rules adds rows to those arrays rather than Python work per
+    sample. Only rules that actually fire are looked at one by one.
+    """
+
+    def __init__(self, preset_name, rules):
+        self.preset_name = preset_name
+        self.rate = sampling_rate(preset_name)
+        self.timestamp_channel = timestamp_channel(preset_name)
+        sensors = PRESET_CONFIGS[preset_name]
+
+        self.features = []
+        self.names = []
+        self.sensors = []
+        feature_of_rule, lo, hi, need, debounce = [], [], [], [], []
+        for sensor_name, specs in rules.items():
+            channels = sensors[sensor_name]['channels']
+            for spec in specs:
+                if spec['channel'] == 'magnitude':
+                    source = tuple(channels)
+                else:
+                    source = channels[sensors[sensor_name]['names'].index(spec['channel'])]
+                window = max(int(round(spec.get('window', 0.0) * self.rate)), 1)
+                feature = (spec.get('signal', 'value'), source, window)
+                if feature not in self.features:
+                    self.features.append(feature)
+                feature_of_rule.append(self.features.index(feature))
+                lo.append(spec.get('below', -np.inf))
+                hi.append(spec.get('above', np.inf))
+                need.append(max(int(round(spec.get('for', 0.0) * self.rate)), 1))
+                debounce.append(spec.get('debounce', 0.0))
+                self.names.append(spec['name'])
+                self.sensors.append(sensor_name)
+
+        self.feature_of_rule = np.array(feature_of_rule, dtype=np.intp)
+        self.lo = np.array(lo, dtype=float)[:, None]
+        self.hi = np.array(hi, dtype=float)[:, None]
+        self.need = np.array(need, dtype=np.int64)
+        self.debounce = np.array(debounce, dtype=float)
+        self.history = max((w for _, _, w in self.features), default=1)
+
+    def new_state(self, num_rows):
+        return _DeviceState(len(self.names), num_rows, len(self.features))
+
+    def _signals(self, ext, n, state):
+        """(features, n) arrays of every distinct signal for the last n samples of ext, and where it is valid
+
+        A signal is valid once its window holds only real samples. BrainFlow
+        reports a row as 0 until the first packet of its stream arrives, so a
+        source only counts as started from its first nonzero sample.
+        """
+        out = np.empty((len(self.features), n))
+        valid = np.empty((len(self.features), n), dtype=bool)
+        positions = np.arange(n)
+        sources = {}
+        for i, (signal, source, window) in enumerate(self.features):
+            if source not in sources:
+                sources[source] = np.sqrt((ext[list(source)] ** 2).sum(axis=0)) \
+                    if isinstance(source, tuple) else ext[source]
+            x = sources[source]
+            if state.seen[i] >= 0:
+                real = state.seen[i] + positions
+            else:
+                started = np.flatnonzero(x[-n:])
+                real = positions - started[0] if len(started) else np.full(n, -1)
+            state.seen[i] = min(real[-1] + 1, self.history) if real[-1] >= 0 else -1
+            # Real samples needed before this one: none for values, the whole window otherwise
+            valid[i] = real >= {'value': 0, 'mean': window - 1}.get(signal, window)
+            if signal == 'value':
+                out[i] = x[-n:]
+            elif signal == 'rate':
+                out[i] = (x[-n:] - x[-n - window:-window]) * self.rate / window
+            elif signal == 'change':
+                out[i] = x[-n:] - x[-n - window:-window]
+            elif signal == 'mean':
+                total = np.cumsum(np.concatenate(([0.0], x)))
+                out[i] = (total[-n:] - total[-n - window:-window]) / window
+            else:
+                raise ValueError(f'unknown signal {signal!r}')
+        return out, valid
+
+    def evaluate(self, state, data):
+        """Run every rule over a new chunk, return [(rule, sample, value)] for each that fires"""
+        n = data.shape[1]
+        if n == 0 or not self.names:
+            return []
+
+        # History in front of the chunk; zeros stand in where there is none
+        # yet, and signals reading them are masked out as not valid
+        ext = np.hstack((state.tail, data))
+        missing = self.history + n - ext.shape[1]
+        if missing > 0:
+            ext = np.hstack((np.zeros((ext.shape[0], missing)), ext))
+        state.tail = ext[:, -self.history:]
+
+        signals, valid = self._signals(ext, n, state)
+        signals = signals[self.feature_of_rule]
+        cond = ((signals > self.hi) | (signals < self.lo)) & valid[self.feature_of_rule]
+
+        # Length of the current run of true conditions, continuing the last chunk's run
+        counts = np.cumsum(cond, axis=1)
+        reset = np.maximum.accumulate(np.where(cond, 0, counts), axis=1)
+        broken = np.logical_or.accumulate(~cond, axis=1)
+        run = counts - reset + np.where(broken, 0, state.run[:, None])
+        active = run >= self.need[:, None]
+
+        previous = np.concatenate((state.active[:, None], active[:, :-1]), axis=1)
+        rising = active & ~previous
+        state.run = np.minimum(run[:, -1], self.need)
+        state.active = active[:, -1]
+
+        fired = []
+        timestamps = data[self.timestamp_channel]
+        for rule, sample in zip(*np.nonzero(rising)):
+            if timestamps[sample] - state.last_fire[rule] < self.debounce[rule]:
+                continue
+            state.last_fire[rule] = timestamps[sample]
+            fired.append((rule, sample, signals[rule, sample]))
+        return fired
+
+
+class RuleEngine:
+    """Evaluate alert rules on each new chunk of every device and preset
+
+    triggers are callables taking an event dict with device, preset,
+    sensor, rule, timestamp and value; they are called as soon as the
+    chunk holding the triggering sample is processed.
+    """
+
+    def __init__(self, rules=RULES, triggers=()):
+        self.presets = {name: PresetRules(name, preset_rules) for name, preset_rules in rules.items()}
+        self.triggers = list(triggers)
+        self.states = {}
+
+    def process(self, device, preset_name, data):
+        rules = self.presets.get(preset_name)
+        if rules is None or data.size == 0:
+            return []
+        key = (device, preset_name)
+        if key not in self.states:
+            self.states[key] = rules.new_state(data.shape[0])
+        events = []
+        for rule, sample, value in rules.evaluate(self.states[key], data):
+            event = {
+                'device': device,
+                'preset': preset_name,
+                'sensor': rules.sensors[rule],
+                'rule': rules.names[rule],
+                'timestamp': float(data[rules.timestamp_channel, sample]),
+                'value': float(value)
+            }
+            events.append(event)
+            for trigger in self.triggers:
+                try:
+                    trigger(event)
+                except Exception as e:
+                    logging.error(f"Trigger failed for {event['rule']}: {e}")
+        return events
+
+
+def log_trigger(event):
+    logging.warning(f"{event['device']}: {event['rule']} on {event['sensor']} ({event['value']:.3f})")
+
+
+def osc_trigger(host, port, prefix='/emotibit'):
+    """Trigger that sends each event as an OSC message <prefix>/<device>/<rule> [timestamp, value]"""
+    from pythonosc.udp_client import SimpleUDPClient
+    client = SimpleUDPClient(host, port)
+
+    def send(event):
+        client.send_message(f"{prefix}/{event['device']}/{event['rule']}", [event['timestamp'], event['value']])
+    return send
+
+
+def fresh_connect(preset_name, seconds, start_delay=1.0, seed=0):
+    """A quiet stream as BrainFlow delivers it right after connecting
+
+    Every sensor row reads 0 until its stream's first packet, then holds a
+    resting level with a little noise.
+    """
+    rate = sampling_rate(preset_name)
+    n = int(seconds * rate)
+    data = np.zeros((BoardShim.get_num_rows(BOARD_ID, PRESET_MAP[preset_name]), n))
+    data[timestamp_channel(preset_name)] = np.arange(n) / rate
+    rng = np.random.default_rng(seed)
+    resting = {'Accelerometer': (0.0, 0.0, 1.0), 'Biometrics': (2.0, 33.0)}
+    for sensor_name, sensor_info in PRESET_CONFIGS[preset_name].items():
+        levels = resting.get(sensor_name, [1.0] * len(sensor_info['channels']))
+        for channel, level in zip(sensor_info['channels'], levels):
+            first = int(rng.uniform(0, start_delay) * rate)
+            data[channel, first:] = level + rng.normal(0, 0.005, n - first)
+    return data
+
+
+def main():
+    """Check that a fresh connect of every preset with rules raises no alert"""
+    logging.basicConfig(level=logging.INFO)
+    engine = RuleEngine(triggers=[log_trigger])
+    events = []
+    for preset_name in RULES:
+        data = fresh_connect(preset_name, 180.0)
+        for start in range(0, data.shape[1], 5):
+            events += engine.process('fresh', preset_name, data[:, start:start + 5])
+    print(f"Fresh connect: {len(events)} alerts")
+    sys.exit(1 if events else 0)
+
+
+if __name__ == '__main__':
+    main()
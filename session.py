@@ -0,0 +1,44 @@
+import os
+from brainflow.board_shim import BoardShim
+from brainflow.data_filter import DataFilter
+from presets import BOARD_ID, PRESET_MAP
+
+# A recorded session is a directory holding one BrainFlow file per preset,
+# e.g. session/DEFAULT.csv, session/AUXILIARY.csv, session/ANCILLARY.csv
+
+
+def preset_file(path, preset_name):
+    return os.path.join(path, f'{preset_name}.csv')
+
+
+def session_presets(path):
+    """Return the preset names that have a recording in this session"""
+    return [name for name in PRESET_MAP if os.path.isfile(preset_file(path, name))]
+
+
+def save_session(path, preset_data):
+    """Write a {preset_name: data} dict as a session directory"""
+    os.makedirs(path, exist_ok=True)
+    for preset_name, data in preset_data.items():
+        DataFilter.write_file(data, preset_file(path, preset_name), 'w')
+
+
+def load_session(path, presets=None):
+    """Read a session directory back into a {preset_name: data} dict"""
+    names = presets if presets is not None else session_presets(path)
+    return {name: DataFilter.read_file(preset_file(path, name)) for name in names}
+
+
+def add_session_streamers(board_shim, path):
+    """Have BrainFlow append every preset to the session directory as it streams
+
+    Recording happens in BrainFlow as data arrives, so it does not depend
+    on the ring buffer size or on the viewer draining it.
+    """
+    os.makedirs(path, exist_ok=True)
+    for preset_name, preset in PRESET_MAP.items():
+        board_shim.add_streamer(f'file://{preset_file(path, preset_name)}:a', preset)
+
+
+def timestamp_channel(preset_name):
+    return BoardShim.get_timestamp_channel(BOARD_ID, PRESET_MAP[preset_name])
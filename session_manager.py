@@ -0,0 +1,263 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from brainflow.board_shim import BoardShim, BrainFlowInputParams
+from brainflow.exit_codes import BrainFlowError, BrainFlowExitCodes
+from protocol import ADVERTISING_PORT, HELLO_EMOTIBIT, HELLO_HOST, make_packet, parse_packet
+from presets import BOARD_ID
+from session import add_session_streamers, timestamp_channel
+
+
+def emotibit_params(ip_address, ip_port=3132, timeout=15):
+    params = BrainFlowInputParams()
+    params.ip_address = ip_address
+    params.ip_port = ip_port
+    params.timeout = timeout
+    return params
+
+
+class DeviceSession:
+    """One board plus its connection bookkeeping
+
+    The BoardShim object is created once and kept across reconnects, so a
+    viewer holding a reference to it keeps working once the stream is back.
+    """
+
+    def __init__(self, name, params):
+        self.name = name
+        self.ip_address = params.ip_address
+        self.board_shim = BoardShim(BOARD_ID, params)
+        self.state = 'idle'
+        self.connect_latency = None
+        self.connect_attempts = 0
+        # Connect cycles (all retries) that ended without a stream, and the
+        # watcher's backoff before starting the next one
+        self.connect_failures = 0
+        self.retry_delay = 0.0
+        self.retry_at = 0.0
+        self.reconnect_count = 0
+        self.last_timestamp = None
+        self.last_data_time = None
+
+    def saw_data(self, timestamp=None):
+        """Mark the stream alive; consumers that drain the board call this with no timestamp"""
+        if timestamp is not None:
+            if self.last_timestamp is not None and timestamp <= self.last_timestamp:
+                return
+            self.last_timestamp = timestamp
+        self.last_data_time = time.monotonic()
+
+    def stats(self):
+        return {
+            'state': self.state,
+            'connect_latency': self.connect_latency,
+            'connect_attempts': self.connect_attempts,
+            'connect_failures': self.connect_failures,
+            'reconnect_count': self.reconnect_count
+        }
+
+
+class _HelloProtocol(asyncio.DatagramProtocol):
+    def __init__(self, answered):
+        self.answered = answered
+
+    def datagram_received(self, data, addr):
+        for line in data.decode(errors='ignore').splitlines():
+            packet = parse_packet(line)
+            if packet is not None and packet[0] == HELLO_HOST and not self.answered.done():
+                self.answered.set_result(addr[0])
+
+
+async def probe(ip_address, timeout=1.0, interval=0.2):
+    """Ask for a HELLO_HOST reply without touching BrainFlow, True if a device answered"""
+    loop = asyncio.get_running_loop()
+    answered = loop.create_future()
+    transport, _ = await loop.create_datagram_endpoint(
+        lambda: _HelloProtocol(answered), local_addr=('0.0.0.0', 0), allow_broadcast=True)
+    hello = (make_packet(0, 0, HELLO_EMOTIBIT) + '\n').encode()
+    try:
+        deadline = loop.time() + timeout
+        while loop.time() < deadline:
+            transport.sendto(hello, (ip_address, ADVERTISING_PORT))
+            try:
+                await asyncio.wait_for(asyncio.shield(answered), interval)
+                return True
+            except asyncio.TimeoutError:
+                pass
+        return False
+    finally:
+        transport.close()
+
+
+class SessionManager:
+    """Prepare and supervise many BrainFlow sessions concurrently
+
+    prepare_session() blocks for up to params.timeout when a device is
+    missing, and BrainFlow serializes prepare calls within a process, so
+    every device is first probed concurrently with a short HELLO_EMOTIBIT
+    exchange. Only devices that answer go on to prepare_session (in a
+    worker thread), so a room of devices is up in about one probe timeout
+    rather than N session timeouts. Failed connects are retried with
+    exponential backoff, and a stream that stops delivering samples is
+    released and prepared again in place.
+    """
+
+    def __init__(self, devices, buffer_size=65536, init_commands=('{"preset":"0"}',),
+                 retries=3, backoff=1.0, max_backoff=30.0, probe_timeout=1.0,
+                 stall_seconds=5.0, watch_interval=1.0, record_to=None):
+        self.sessions = {name: DeviceSession(name, params) for name, params in devices.items()}
+        self.buffer_size = buffer_size
+        self.init_commands = init_commands
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.probe_timeout = probe_timeout
+        self.stall_seconds = stall_seconds
+        self.watch_interval = watch_interval
+        self.record_to = record_to
+        self.loop = None
+        self.thread = None
+        self.watch_task = None
+
+    def _open(self, session):
+        board_shim = session.board_shim
+        if board_shim.is_prepared():
+            board_shim.release_session()
+        board_shim.prepare_session()
+        for command in self.init_commands:
+            board_shim.config_board(command)
+        # Streamers append, so a reconnect continues the same recording
+        if self.record_to is not None:
+            add_session_streamers(board_shim, self.session_path(session.name))
+        board_shim.start_stream(self.buffer_size)
+
+    def session_path(self, name):
+        return os.path.join(self.record_to, name)
+
+    def _close(self, session):
+        if session.board_shim.is_prepared():
+            session.board_shim.release_session()
+
+    async def connect(self, session):
+        loop = asyncio.get_running_loop()
+        delay = self.backoff
+        for attempt in range(self.retries + 1):
+            session.state = 'connecting'
+            session.connect_attempts += 1
+            start = time.monotonic()
+            try:
+                if not await probe(session.ip_address, self.probe_timeout):
+                    raise BrainFlowError('no answer to HELLO_EMOTIBIT', BrainFlowExitCodes.BOARD_NOT_READY_ERROR)
+                await loop.run_in_executor(None, self._open, session)
+            except BrainFlowError as e:
+                logging.warning(f'{session.name}: connect attempt {attempt + 1} failed: {e}')
+                if attempt < self.retries:
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, self.max_backoff)
+                continue
+            session.connect_latency = time.monotonic() - start
+            session.last_timestamp = None
+            session.last_data_time = time.monotonic()
+            session.state = 'streaming'
+            session.retry_delay = 0.0
+            logging.info(f'{session.name}: streaming after {session.connect_latency:.2f}s')
+            return True
+        # The watcher retries the whole cycle, backing off further each time it fails
+        session.connect_failures += 1
+        session.retry_delay = min(max(2 * session.retry_delay, delay), self.max_backoff)
+        session.retry_at = time.monotonic() + session.retry_delay
+        session.state = 'failed'
+        return False
+
+    async def connect_all(self):
+        results = await asyncio.gather(*(self.connect(s) for s in self.sessions.values()))
+        return {name: ok for name, ok in zip(self.sessions, results)}
+
+    async def reconnect(self, session):
+        session.state = 'reconnecting'
+        session.reconnect_count += 1
+        logging.warning(f'{session.name}: stream stalled, reconnecting ({session.reconnect_count})')
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, self._close, session)
+        except BrainFlowError as e:
+            logging.warning(f'{session.name}: release failed: {e}')
+        await self.connect(session)
+
+    async def watch(self):
+        """Reconnect any streaming session whose newest timestamp stops advancing
+
+        Sessions that failed to connect are retried too, once their backoff
+        has passed; those retries count as connect_failures, not reconnects.
+        """
+        ts_channel = timestamp_channel('DEFAULT')
+        reconnecting = {}
+        while True:
+            await asyncio.sleep(self.watch_interval)
+            now = time.monotonic()
+            for session in self.sessions.values():
+                if session.name in reconnecting:
+                    if reconnecting[session.name].done():
+                        del reconnecting[session.name]
+                    continue
+                if session.state == 'failed':
+                    if now >= session.retry_at:
+                        logging.info(f'{session.name}: retrying connect after {session.retry_delay:.0f}s')
+                        reconnecting[session.name] = asyncio.ensure_future(self.connect(session))
+                    continue
+                if session.state != 'streaming':
+                    continue
+                # The sample count stops growing once the ring buffer is full,
+                # so look at the newest sample instead. Consumers that drain
+                # the buffer leave nothing to look at and report through
+                # saw_data() instead.
+                try:
+                    latest = session.board_shim.get_current_board_data(1)
+                    if latest.size:
+                        session.saw_data(latest[ts_channel, -1])
+                except BrainFlowError:
+                    pass
+                if now - session.last_data_time > self.stall_seconds:
+                    reconnecting[session.name] = asyncio.ensure_future(self.reconnect(session))
+
+    def start(self):
+        """Run the manager on a background event loop and wait for the first connect
+
+        Returns {name: BoardShim} for the devices that connected. Devices that
+        did not are retried by the watcher and appear in stats() once up.
+        """
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        results = asyncio.run_coroutine_threadsafe(self.connect_all(), self.loop).result()
+        self.watch_task = asyncio.run_coroutine_threadsafe(self.watch(), self.loop)
+        return {name: self.sessions[name].board_shim for name, ok in results.items() if ok}
+
+    async def _shutdown(self):
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # A prepare_session already running in a worker thread cannot be
+        # interrupted, wait for it so the release below sees its result
+        await asyncio.get_running_loop().shutdown_default_executor()
+
+    def stop(self):
+        if self.loop is not None:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop).result()
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+        for session in self.sessions.values():
+            try:
+                self._close(session)
+            except BrainFlowError as e:
+                logging.warning(f'{session.name}: release failed: {e}')
+
+    def saw_data(self, name):
+        """Tell the watcher a consumer just drained samples from the named device"""
+        self.sessions[name].saw_data()
+
+    def stats(self):
+        return {name: session.stats() for name, session in self.sessions.items()}
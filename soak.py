@@ -0,0 +1,175 @@
+import argparse
+import logging
+import os
+import resource
+import sys
+import time
+import tracemalloc
+import numpy as np
+from brainflow.board_shim import BoardShim, BrainFlowInputParams, BoardIds
+from buffers import ChannelRing
+from pipeline import Plan
+from presets import PRESET_CONFIGS
+from quality import QualityMonitor
+from session import preset_file
+
+
+def rss_bytes():
+    """Current resident set size, or the peak where /proc is not available"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        scale = 1 if sys.platform == 'darwin' else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def open_board(replay=None, buffer_size=4096):
+    """Synthetic board, or a recorded session's DEFAULT preset played back in a loop
+
+    BrainFlow's ring buffer only becomes resident as it is written, which
+    looks like RSS growth until it wraps, so it is kept small here.
+    """
+    params = BrainFlowInputParams()
+    if replay is None:
+        board_id = BoardIds.SYNTHETIC_BOARD
+    else:
+        board_id = BoardIds.PLAYBACK_FILE_BOARD
+        params.file = preset_file(replay, 'DEFAULT')
+        params.master_board = BoardIds.EMOTIBIT_BOARD
+    board_shim = BoardShim(board_id, params)
+    board_shim.prepare_session()
+    if replay is not None:
+        board_shim.config_board('loopback_true')
+    board_shim.start_stream(buffer_size)
+    return board_shim
+
+
+def soak(board_shim, sensors, minutes, fps=30, window=4, warmup=20.0, trace_frames=300, report_every=60.0):
+    """Run the viewers' per-frame data path and measure its memory use
+
+    Each frame drains the board into a ChannelRing, updates the signal
+    quality and processes the window, like accGyrMagPPG_gpu's update()
+    (accGyrMag_gpu_pyopengl runs the same path without the quality step).
+    The first `trace_frames` frames run under tracemalloc to measure the
+    peak transient bytes of each frame: how far the traced heap rises above
+    its level at the start of the frame. That is not the total allocated,
+    since memory freed within a frame is reused by the next temporary.
+    Tracing is then turned off, since its own bookkeeping would show up as
+    RSS growth, and RSS is sampled for the rest of the run and fitted to a
+    growth rate.
+    """
+    rate = BoardShim.get_sampling_rate(board_shim.get_board_id())
+    ring = ChannelRing(sensors, int(window * rate))
+    plan = Plan(sensors, rate)
+    quality = QualityMonitor(sensors, rate)
+    interval = 1.0 / fps
+
+    def frame():
+        data = board_shim.get_board_data()
+        ring.append(data)
+        quality.push(data)
+        ring.process(plan, quality.active)
+
+    # Warm up so one-off allocations (caches, first buffers, BrainFlow's
+    # ring buffer) are not counted
+    for _ in range(int(warmup * fps)):
+        frame()
+        time.sleep(interval)
+
+    tracemalloc.start()
+    total_peak = 0
+    largest_peak = 0
+    baseline = tracemalloc.get_traced_memory()[0]
+    for _ in range(trace_frames):
+        frame_start = time.perf_counter()
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        frame()
+        peak = tracemalloc.get_traced_memory()[1] - before
+        total_peak += peak
+        largest_peak = max(largest_peak, peak)
+        time.sleep(max(0.0, interval - (time.perf_counter() - frame_start)))
+    growth = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    # RSS samples go into preallocated arrays so the harness itself does not grow
+    num_samples = int(minutes * 60.0 / report_every) + 2
+    rss_times = np.zeros(num_samples)
+    rss_values = np.zeros(num_samples)
+    rss_values[0] = rss_bytes()
+    count = 1
+    frames = trace_frames
+    start = time.perf_counter()
+    end = start + minutes * 60.0
+    next_report = report_every
+    while True:
+        frame_start = time.perf_counter()
+        if frame_start >= end:
+            break
+        frame()
+        frames += 1
+        elapsed = frame_start - start
+        if elapsed >= next_report and count < num_samples - 1:
+            rss_times[count] = elapsed
+            rss_values[count] = rss_bytes()
+            logging.info(f'{elapsed / 60:.1f} min: RSS {rss_values[count] / 2**20:.1f} MiB')
+            count += 1
+            next_report += report_every
+        time.sleep(max(0.0, interval - (time.perf_counter() - frame_start)))
+    rss_times[count] = time.perf_counter() - start
+    rss_values[count] = rss_bytes()
+    count += 1
+
+    slope = np.polyfit(rss_times[:count], rss_values[:count], 1)[0]
+    return {
+        'frames': frames,
+        'peak_bytes_per_frame': total_peak / max(trace_frames, 1),
+        'max_peak_bytes_per_frame': largest_peak,
+        'traced_growth': growth,
+        'rss_per_hour': float(slope * 3600.0)
+    }
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description='Memory soak test of the viewer data path')
+    parser.add_argument('--minutes', type=float, default=10.0)
+    parser.add_argument('--fps', type=int, default=30)
+    parser.add_argument('--trace-frames', type=int, default=300, help='frames measured under tracemalloc')
+    parser.add_argument('--report-every', type=float, default=60.0, help='seconds between RSS samples')
+    parser.add_argument('--buffer-size', type=int, default=4096, help='BrainFlow stream buffer, in samples')
+    parser.add_argument('--replay', help='session directory to play back instead of the synthetic board')
+    parser.add_argument('--max-peak-bytes-per-frame', type=float, default=64 * 1024,
+                        help='mean peak transient bytes per frame')
+    parser.add_argument('--max-rss-mb-per-hour', type=float, default=10.0)
+    args = parser.parse_args()
+
+    board_shim = open_board(args.replay, args.buffer_size)
+    warmup = args.buffer_size / BoardShim.get_sampling_rate(board_shim.get_board_id()) + 2.0
+    try:
+        result = soak(board_shim, PRESET_CONFIGS['DEFAULT'], args.minutes, args.fps, warmup=warmup,
+                      trace_frames=args.trace_frames, report_every=args.report_every)
+    finally:
+        board_shim.release_session()
+
+    print(f"Frames: {result['frames']}")
+    print(f"Peak transient bytes per frame: {result['peak_bytes_per_frame']:.0f} B "
+          f"(max {result['max_peak_bytes_per_frame']} B)")
+    print(f"Traced heap growth: {result['traced_growth']} B")
+    print(f"RSS growth: {result['rss_per_hour'] / 2**20:.2f} MiB/hour")
+
+    failed = []
+    if result['peak_bytes_per_frame'] > args.max_peak_bytes_per_frame:
+        failed.append('peak transient bytes per frame')
+    if result['rss_per_hour'] / 2**20 > args.max_rss_mb_per_hour:
+        failed.append('RSS growth')
+    if failed:
+        print(f"FAILED: {', '.join(failed)} above threshold")
+        sys.exit(1)
+    print('PASSED')
+
+
+if __name__ == '__main__':
+    main()
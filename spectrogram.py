@@ -0,0 +1,108 @@
+import numpy as np
+import pyqtgraph as pg
+from numpy.lib.stride_tricks import sliding_window_view
+from PyQt5.QtCore import QRectF
+
+
+class IncrementalSTFT:
+    """Sliding-window STFT that only transforms newly completed hops
+
+    Samples are pushed as (channels, n) blocks. Everything needed per frame
+    (window, frequency axis, input buffer) is allocated once up front, and
+    each push transforms just the frames that the new samples complete.
+    """
+
+    def __init__(self, num_channels, sampling_rate, nfft=64, hop=8):
+        self.num_channels = num_channels
+        self.sampling_rate = sampling_rate
+        self.nfft = nfft
+        self.hop = hop
+        self.window = np.hanning(nfft)
+        self.freqs = np.fft.rfftfreq(nfft, 1.0 / sampling_rate)
+        # Scale so that power is comparable between window lengths
+        self.scale = 1.0 / (sampling_rate * np.sum(self.window ** 2))
+        self.buffer = np.zeros((num_channels, 4 * nfft))
+        self.filled = 0
+
+    @property
+    def num_bins(self):
+        return len(self.freqs)
+
+    def reset(self):
+        self.filled = 0
+
+    def push(self, samples):
+        """Feed new samples, return (channels, frames, bins) power for completed hops"""
+        n = samples.shape[1]
+        if self.filled + n > self.buffer.shape[1]:
+            grown = np.zeros((self.num_channels, 2 * (self.filled + n)))
+            grown[:, :self.filled] = self.buffer[:, :self.filled]
+            self.buffer = grown
+        self.buffer[:, self.filled:self.filled + n] = samples
+        self.filled += n
+
+        if self.filled < self.nfft:
+            return np.empty((self.num_channels, 0, self.num_bins))
+
+        num_frames = (self.filled - self.nfft) // self.hop + 1
+        frames = sliding_window_view(self.buffer[:, :self.filled], self.nfft, axis=1)[:, ::self.hop][:, :num_frames]
+        frames = frames - frames.mean(axis=2, keepdims=True)
+        power = np.abs(np.fft.rfft(frames * self.window, axis=2)) ** 2 * self.scale
+
+        # Keep the samples still needed by the next, incomplete frame
+        consumed = num_frames * self.hop
+        remaining = self.filled - consumed
+        self.buffer[:, :remaining] = self.buffer[:, consumed:self.filled]
+        self.filled = remaining
+        return power
+
+
+class SpectrogramPanel:
+    """Scrolling spectrogram image for one sensor, fed by an IncrementalSTFT
+
+    The image array is preallocated and scrolled in place, but every update
+    still hands the whole array to the ImageItem, which re-renders its
+    QImage on the next paint: pyqtgraph has no way to update part of an
+    image. At 100 columns x 33 bins a push plus that re-render costs about
+    a millisecond and happens at most once per paint, so a column ring with a moving transform was not worth the
+    extra items it would need.
+    """
+
+    def __init__(self, plot, num_channels, sampling_rate, nfft=64, hop=8, num_columns=100):
+        self.stft = IncrementalSTFT(num_channels, sampling_rate, nfft, hop)
+        self.image = np.full((num_columns, self.stft.num_bins), np.nan, dtype=np.float32)
+        self.levels = None
+
+        self.item = pg.ImageItem()
+        self.item.setColorMap(pg.colormap.get('viridis'))
+        plot.addItem(self.item)
+        # setRect needs the image size, so hand over the (empty) image first
+        self.item.setImage(self.image, autoLevels=False, levels=(0.0, 1.0))
+        span = num_columns * hop / sampling_rate
+        self.item.setRect(QRectF(-span, 0, span, sampling_rate / 2))
+        plot.setLabel('left', 'Frequency (Hz)')
+
+    def reset(self):
+        self.stft.reset()
+        self.image.fill(np.nan)
+        self.levels = None
+
+    def push(self, samples):
+        """Append new samples, scrolling the image by one column per completed hop"""
+        power = self.stft.push(samples)
+        k = power.shape[1]
+        if k == 0:
+            return
+        columns = np.log10(power.mean(axis=0) + 1e-12)
+        k = min(k, self.image.shape[0])
+        self.image[:-k] = self.image[k:]
+        self.image[-k:] = columns[-k:]
+
+        lo, hi = float(columns.min()), float(columns.max())
+        if self.levels is None:
+            self.levels = [lo, hi]
+        else:
+            self.levels[0] = min(lo, 0.95 * self.levels[0] + 0.05 * lo)
+            self.levels[1] = max(hi, 0.95 * self.levels[1] + 0.05 * hi)
+        # Full upload, see the class docstring
+        self.item.setImage(self.image, autoLevels=False, levels=self.levels)